@@ -5,7 +5,9 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
 from flask import Flask
+import instrumentation
 from database import init_database, add_sample_data
 from routes import register_blueprints
 
@@ -20,6 +22,12 @@ def create_app():
     app = Flask(__name__)
     app.secret_key = "super secret key"
     
+    # Background payment workers started on the first queued payment
+    # (0 = none in the web process; run `python -m services.payment_jobs`)
+    app.config['PAYMENT_WORKERS'] = int(os.environ.get('PAYMENT_WORKERS', 2))
+    # Payment gateway API root; unset uses the simulated gateway
+    app.config['PAYMENT_GATEWAY_URL'] = os.environ.get('PAYMENT_GATEWAY_URL')
+    
     # Initialize the database
     init_database()
     
@@ -29,6 +37,10 @@ def create_app():
     # Register all route blueprints
     register_blueprints(app)
     
+    # Per-request timing, SQL counts and slow query log (SLOW_QUERY_MS)
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', instrumentation.SLOW_QUERY_MS))
+    instrumentation.init_app(app)
+    
     return app
 
 
@@ -0,0 +1,216 @@
+"""
+Benchmark Suite - Latency of the service and database hot paths
+
+Seeds a throwaway database at each requested scale (N books and N loans,
+from services.generate_data) and times search_books_in_catalog, borrow_book_by_patron,
+return_book_by_patron, get_patron_status_report and get_all_books,
+reporting p50/p95/p99 latency and ops/sec. The search benchmarks empty the
+search result and book caches before every call so they time the database
+lookups; search_cached times repeated searches answered from the cache.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scales 1k,100k,1m] [--runs 200]
+        [--json results.json] [--save-baseline benchmarks/baseline.json]
+        [--baseline benchmarks/baseline.json --threshold 0.25]
+
+With --baseline the run exits with status 1 if any benchmark's --metric
+(p95 by default) is more than --threshold (a fraction) slower than the
+baseline. Baselines are machine specific; record one on the machine that
+runs the gate. benchmarks/baseline.json is the committed 1k baseline:
+    python benchmarks/run_benchmarks.py --scales 1k --runs 1000 --save-baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import database
+from services.generate_data import generate_dataset
+from services.library_service import (
+    borrow_book_by_patron, clear_search_cache, get_all_books, get_patron_status_report,
+    return_book_by_patron, search_books_in_catalog
+)
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BORROWER = "099999"  # outside the generated patron range, so starts with no loans
+
+
+def seed(size: int, seed_value: int = 42) -> Dict:
+    """
+    Fill the current database with `size` books and `size` loans.
+
+    Returns sample search terms, ISBNs and book ids for the benchmarks, and
+    the patron with the longest history for the status report.
+    """
+    report = generate_dataset(
+        books=size, patrons=max(100, size // 20), loans=size, seed=seed_value, replace=True
+    )
+    rng = random.Random(seed_value)
+    conn = database.get_db_connection()
+    try:
+        rows = [
+            conn.execute("SELECT id, title, author, isbn FROM books WHERE id = ?", (book_id,)).fetchone()
+            for book_id in (rng.randint(1, size) for _ in range(64))
+        ]
+    finally:
+        conn.close()
+
+    return {
+        'heavy_patron': report['busiest_patron'],
+        'book_ids': [r['id'] for r in rows],
+        'isbns': [r['isbn'] for r in rows],
+        'title_terms': [" ".join(r['title'].split()[:2]) for r in rows],
+        'author_terms': [r['author'].split()[-1] for r in rows],
+    }
+
+
+def uncached_search(term: str, search_type: str) -> List[Dict]:
+    """Search with the result and book caches emptied first, so the lookup reaches the database."""
+    clear_search_cache()
+    database.clear_book_cache()
+    return search_books_in_catalog(term, search_type)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency percentiles (ms) and throughput for samples given in seconds."""
+    total = sum(samples)
+    return {
+        'runs': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'ops_per_sec': round(len(samples) / total, 1) if total else None,
+    }
+
+
+def measure(op: Callable[[int], object], runs: int, budget: float, min_runs: int = 5) -> List[float]:
+    """Time op(i) up to `runs` times, stopping early after `budget` seconds (but not before min_runs)."""
+    op(0)  # warm the pool, caches and page cache
+    samples = []
+    deadline = time.perf_counter() + budget
+    for i in range(runs):
+        started = time.perf_counter()
+        op(i)
+        samples.append(time.perf_counter() - started)
+        if len(samples) >= min_runs and time.perf_counter() > deadline:
+            break
+    return samples
+
+
+def run_scale(size: int, runs: int = 200, budget: float = 10.0) -> Dict[str, Dict]:
+    """Seed a fresh database with `size` rows and time every benchmark."""
+    with tempfile.TemporaryDirectory() as tmp:
+        database.close_pool()
+        database.DATABASE = os.path.join(tmp, "bench.db")
+        database._DB_BOOTSTRAPPED = False
+        try:
+            data = seed(size)
+            n = len(data['book_ids'])
+            results = {}
+
+            def timed(name: str, op: Callable[[int], object]) -> None:
+                results[name] = summarize(measure(op, runs, budget))
+
+            timed('search_title', lambda i: uncached_search(data['title_terms'][i % n], 'title'))
+            timed('search_author', lambda i: uncached_search(data['author_terms'][i % n], 'author'))
+            timed('search_isbn', lambda i: uncached_search(data['isbns'][i % n], 'isbn'))
+            for term in data['title_terms']:  # every timed call is then a cache hit
+                search_books_in_catalog(term, 'title')
+            timed('search_cached', lambda i: search_books_in_catalog(data['title_terms'][i % n], 'title'))
+            timed('patron_status_report', lambda i: get_patron_status_report(data['heavy_patron']))
+
+            # Borrow and return alternate on the same books so availability stays constant.
+            borrow, ret = [], []
+            borrow_book_by_patron(BORROWER, data['book_ids'][0])
+            return_book_by_patron(BORROWER, data['book_ids'][0])
+            deadline = time.perf_counter() + budget
+            for i in range(runs):
+                book_id = data['book_ids'][i % n]
+                started = time.perf_counter()
+                borrow_book_by_patron(BORROWER, book_id)
+                borrow.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                return_book_by_patron(BORROWER, book_id)
+                ret.append(time.perf_counter() - started)
+                if len(borrow) >= 5 and time.perf_counter() > deadline:
+                    break
+            results['borrow_book'] = summarize(borrow)
+            results['return_book'] = summarize(ret)
+
+            timed('get_all_books', lambda i: get_all_books())
+            return results
+        finally:
+            database.close_pool()
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, metric: str = 'p95_ms') -> List[str]:
+    """Describe every benchmark whose metric is more than `threshold` slower than the baseline."""
+    regressions = []
+    for scale, benches in results.items():
+        for name, stats in benches.items():
+            before = baseline.get(scale, {}).get(name, {}).get(metric)
+            after = stats.get(metric)
+            if before and after is not None and after > before * (1 + threshold):
+                regressions.append(
+                    f"{scale}/{name}: {metric} {after:.3f} vs baseline {before:.3f} (+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='1k,100k', help="comma-separated: %s" % ",".join(SCALES))
+    parser.add_argument('--runs', type=int, default=200, help="timed calls per benchmark")
+    parser.add_argument('--budget', type=float, default=10.0, help="seconds per benchmark before stopping early")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--save-baseline', help="write results as the new baseline file")
+    parser.add_argument('--baseline', help="baseline file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown as a fraction (0.25 = 25%%)")
+    parser.add_argument('--metric', default='p95_ms', choices=('p50_ms', 'p95_ms', 'p99_ms'))
+    args = parser.parse_args(argv)
+
+    scales = [s.strip().lower() for s in args.scales.split(',') if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error("unknown scale(s): %s" % ", ".join(unknown))
+
+    results = {}
+    for scale in scales:
+        started = time.perf_counter()
+        results[scale] = run_scale(SCALES[scale], args.runs, args.budget)
+        print(f"\n== {scale} ({SCALES[scale]} books and loans, {time.perf_counter() - started:.1f}s) ==")
+        print(f"{'benchmark':<22}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+        for name, stats in results[scale].items():
+            print(f"{name:<22}{stats['runs']:>6}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                  f"{stats['p99_ms']:>10.3f}{stats['ops_per_sec']:>10.1f}")
+
+    for path in filter(None, (args.json, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold, args.metric)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print("  " + line, file=sys.stderr)
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} of baseline {args.metric}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
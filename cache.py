@@ -0,0 +1,72 @@
+"""
+Cache module for Library Management System
+Small in-process LRU cache with optional TTL, shared by the database and
+service layers
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache.
+
+    Holds at most `max_size` entries; the least recently used entry is
+    evicted to make room. With `ttl` set, entries older than `ttl` seconds
+    are treated as missing. Hit, miss, eviction, expiration and
+    invalidation counts are kept for stats().
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None) -> None:
+        if max_size <= 0:
+            raise ValueError("Cache size must be a positive integer.")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=len(self._entries), max_size=self.max_size, ttl=self.ttl)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
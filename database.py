@@ -3,13 +3,45 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import base64
+import json
+import queue
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import instrumentation
+from cache import LRUCache
 
 # Database configuration
 DATABASE = "library.db"
 
+# Default cap on the number of rows returned by catalog searches
+SEARCH_RESULT_LIMIT = 100
+
+# Columns written by catalog exports, in output order
+BOOK_EXPORT_COLUMNS = ("id", "title", "author", "isbn", "total_copies", "available_copies")
+# Columns returned for book records (isbn_normalized is internal)
+BOOK_COLUMNS = ", ".join(BOOK_EXPORT_COLUMNS)
+
+# Catalog pagination defaults (see get_books_page)
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 200
+
+# Book record cache used by get_book_by_id / get_book_by_isbn
+BOOK_CACHE_SIZE = 4096
+BOOK_CACHE_TTL = 60.0
+
+# Seconds between checks for catalog writes made by other processes
+COHERENCE_CHECK_INTERVAL = 0.1
+
+# Connection pool configuration (see configure_pool)
+POOL_SIZE = 5
+POOL_TIMEOUT = 5.0
+POOL_HEALTH_CHECK_INTERVAL = 30.0
+
 
 _DB_BOOTSTRAPPED = False
 
@@ -49,6 +81,286 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
     )
 
     conn.commit()
+    apply_migrations(conn)
+
+
+# --------------------------
+# Schema Migrations
+# --------------------------
+
+# Applied in order on top of the base tables. Migration N (1-based) is
+# recorded by setting PRAGMA user_version = N, so existing databases pick
+# up only the steps they are missing. Append new steps; never edit old ones.
+MIGRATIONS: List[Tuple[str, ...]] = [
+    # 1: indexes for the active-loan lookups on borrow_records
+    (
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_return
+        ON borrow_records (patron_id, return_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book_return
+        ON borrow_records (book_id, return_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active
+        ON borrow_records (patron_id, book_id)
+        WHERE return_date IS NULL
+        """,
+    ),
+    # 2: FTS5 index over book titles and authors, kept in sync by triggers
+    (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, content='books', content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ),
+    # 3: keyset index for catalog pagination ordered by (title, id)
+    (
+        "CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)",
+    ),
+    # 4: due-date index over open loans for overdue/billing scans
+    (
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_due
+        ON borrow_records (due_date)
+        WHERE return_date IS NULL
+        """,
+    ),
+    # 5: per-patron loans in borrow_date order for status reports
+    (
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_borrowed
+        ON borrow_records (patron_id, borrow_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_active_borrowed
+        ON borrow_records (patron_id, borrow_date)
+        WHERE return_date IS NULL
+        """,
+    ),
+    # 6: catalog version counter, bumped by triggers on every change to books
+    (
+        """
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('catalog_version', 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS books_version_ai AFTER INSERT ON books BEGIN
+            UPDATE catalog_meta SET value = value + 1 WHERE key = 'catalog_version';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_version_au AFTER UPDATE ON books BEGIN
+            UPDATE catalog_meta SET value = value + 1 WHERE key = 'catalog_version';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_version_ad AFTER DELETE ON books BEGIN
+            UPDATE catalog_meta SET value = value + 1 WHERE key = 'catalog_version';
+        END
+        """,
+    ),
+    # 7: per-loan breakdown of late fee payments, for itemized charges and refunds
+    (
+        """
+        CREATE TABLE IF NOT EXISTS fee_payment_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id TEXT NOT NULL,
+            patron_id TEXT NOT NULL,
+            borrow_record_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            refunded_amount REAL NOT NULL DEFAULT 0,
+            paid_at TEXT NOT NULL,
+            FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_fee_payment_items_txn
+        ON fee_payment_items (transaction_id, book_id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_fee_payment_items_patron
+        ON fee_payment_items (patron_id, borrow_record_id)
+        """,
+    ),
+    # 8: queue of late fee payments and refunds handled by background workers
+    (
+        """
+        CREATE TABLE IF NOT EXISTS payment_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL CHECK (kind IN ('payment', 'refund')),
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_payment_jobs_queued
+        ON payment_jobs (id) WHERE status = 'queued'
+        """,
+    ),
+    # 9: local ledger of gateway transactions, so settled ones need no status call
+    (
+        """
+        CREATE TABLE IF NOT EXISTS payment_transactions (
+            transaction_id TEXT PRIMARY KEY,
+            patron_id TEXT,
+            amount REAL,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ),
+    # 10: ISBN without hyphens/spaces, indexed so every ISBN lookup is a seek
+    (
+        "ALTER TABLE books ADD COLUMN isbn_normalized TEXT",
+        "UPDATE books SET isbn_normalized = REPLACE(REPLACE(isbn, '-', ''), ' ', '')",
+        """
+        CREATE INDEX IF NOT EXISTS idx_books_isbn_normalized
+        ON books (isbn_normalized)
+        """,
+    ),
+    # 11: rebuild books_fts with the trigram tokenizer so substrings anywhere match
+    (
+        "DROP TRIGGER IF EXISTS books_fts_ai",
+        "DROP TRIGGER IF EXISTS books_fts_ad",
+        "DROP TRIGGER IF EXISTS books_fts_au",
+        "DROP TABLE IF EXISTS books_fts",
+        """
+        CREATE VIRTUAL TABLE books_fts USING fts5(
+            title, author, content='books', content_rowid='id', tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+        """
+        CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+        """,
+        """
+        CREATE TRIGGER books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author)
+            VALUES (new.id, new.title, new.author);
+        END
+        """,
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ),
+    # 12: at most one queued or running job per dedupe key (e.g. patron and book)
+    (
+        "ALTER TABLE payment_jobs ADD COLUMN dedupe_key TEXT",
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_jobs_active_key
+        ON payment_jobs (dedupe_key) WHERE status IN ('queued', 'running')
+        """,
+    ),
+    # 13: running total of refunds per transaction, so partial refunds aren't final
+    (
+        "ALTER TABLE payment_transactions ADD COLUMN refunded_amount REAL NOT NULL DEFAULT 0",
+    ),
+    # 14: derive isbn_normalized from isbn in the database (a VIRTUAL generated
+    # column), so rows written by any code path can be found by ISBN
+    (
+        "DROP INDEX IF EXISTS idx_books_isbn_normalized",
+        "ALTER TABLE books DROP COLUMN isbn_normalized",
+        """
+        ALTER TABLE books ADD COLUMN isbn_normalized TEXT
+        GENERATED ALWAYS AS (REPLACE(REPLACE(isbn, '-', ''), ' ', '')) VIRTUAL
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_books_isbn_normalized
+        ON books (isbn_normalized)
+        """,
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Steps that build books_fts. SQLite without FTS5, or older than 3.34 (no
+# trigram tokenizer), fails on their CREATE VIRTUAL TABLE; the rest of the
+# step is then skipped, leaving no books_fts, and search_books_fts returns
+# None so searches fall back to a catalog scan.
+FTS_MIGRATIONS = {2, 11}
+
+
+def _missing_fts_support(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return message.startswith("no such module: fts5") or message.startswith("no such tokenizer")
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the migration level recorded in PRAGMA user_version."""
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION in place.
+
+    Each migration runs in its own IMMEDIATE transaction together with its
+    user_version bump, so a crash leaves the database at a clean version and
+    concurrent workers starting at the same time apply each step only once.
+
+    Returns:
+        int: schema version after upgrading
+    """
+    while get_schema_version(conn) < SCHEMA_VERSION:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = get_schema_version(conn)
+            if version < SCHEMA_VERSION:
+                for statement in MIGRATIONS[version]:
+                    try:
+                        conn.execute(statement)
+                    except sqlite3.OperationalError as e:
+                        if version + 1 not in FTS_MIGRATIONS or not _missing_fts_support(e):
+                            raise
+                        break
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return get_schema_version(conn)
 
 
 def init_database() -> None:
@@ -115,11 +427,442 @@ def _bootstrap_db_once() -> None:
     _DB_BOOTSTRAPPED = True
 
 
+# --------------------------
+# Connection Pool
+# --------------------------
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to its pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool: Optional["ConnectionPool"] = None
+        self.last_used = time.monotonic()
+
+    def execute(self, sql, parameters=()):
+        # Only pay for instrumentation while a request is being tracked.
+        if instrumentation.current_stats() is None:
+            return super().execute(sql, parameters)
+        return self.cursor(instrumentation.InstrumentedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if instrumentation.current_stats() is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor(instrumentation.InstrumentedCursor).executemany(sql, seq_of_parameters)
+
+    def close(self) -> None:
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self) -> None:
+        """Close the underlying connection for real."""
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections to one database file.
+
+    Idle connections are reused most-recently-released first. When all
+    `size` connections are checked out, callers wait up to `timeout`
+    seconds before PoolTimeoutError is raised. A connection idle for longer
+    than `health_check_interval` seconds is pinged before being handed out
+    and replaced if the ping fails.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        size: int = POOL_SIZE,
+        timeout: float = POOL_TIMEOUT,
+        health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        if size <= 0:
+            raise ValueError("Pool size must be a positive integer.")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+        self._stats = {"created": 0, "reused": 0, "waits": 0, "timeouts": 0, "discarded": 0}
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.database, factory=PooledConnection, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        return conn
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: PooledConnection) -> None:
+        with self._lock:
+            self._open -= 1
+            self._stats["discarded"] += 1
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, creating one if the pool is not full."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._open < self.size
+                    if can_create:
+                        self._open += 1
+                        self._stats["created"] += 1
+                    else:
+                        self._stats["waits"] += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s."
+                    )
+
+            if self._is_healthy(conn):
+                with self._lock:
+                    self._stats["reused"] += 1
+                return conn
+            self._discard(conn)
+
+    def release(self, conn: PooledConnection) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+            return
+
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def close(self) -> None:
+        """Close idle connections; checked-out ones are closed on release."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._open
+        idle = self._idle.qsize()
+        stats.update(size=self.size, idle=idle, in_use=stats["open"] - idle)
+        return stats
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ConnectionPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.database != DATABASE:
+            if _POOL is not None:
+                _POOL.close()
+            # Cached rows may belong to a different database file.
+            clear_book_cache()
+            _POOL = ConnectionPool(
+                DATABASE, POOL_SIZE, POOL_TIMEOUT, POOL_HEALTH_CHECK_INTERVAL
+            )
+        return _POOL
+
+
+def configure_pool(
+    size: Optional[int] = None,
+    timeout: Optional[float] = None,
+    health_check_interval: Optional[float] = None,
+) -> None:
+    """
+    Change pool settings. The current pool is closed and a new one
+    with the updated settings is created on the next connection request.
+    """
+    global POOL_SIZE, POOL_TIMEOUT, POOL_HEALTH_CHECK_INTERVAL
+    if size is not None:
+        POOL_SIZE = size
+    if timeout is not None:
+        POOL_TIMEOUT = timeout
+    if health_check_interval is not None:
+        POOL_HEALTH_CHECK_INTERVAL = health_check_interval
+    close_pool()
+
+
+def close_pool() -> None:
+    """Close every idle pooled connection, drop the pool and cached rows."""
+    global _POOL, _MONITOR
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+        if _MONITOR is not None:
+            _MONITOR.close()
+            _MONITOR = None
+    for invalidate in list(_CACHE_INVALIDATORS):
+        invalidate()
+
+
+def get_pool_stats() -> Dict:
+    """Connections created, reused, waited for, timed out and discarded."""
+    return _get_pool().stats()
+
+
 def get_db_connection() -> sqlite3.Connection:
+    """Check out a pooled connection; call close() to give it back."""
     _bootstrap_db_once()
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _get_pool().acquire()
+
+
+# --------------------------
+# Cross-Process Cache Coherence
+# --------------------------
+
+class CatalogVersionMonitor:
+    """
+    Tracks the catalog_version counter that triggers bump on every insert,
+    update or delete in `books`, from any process.
+
+    version() re-reads the counter at most once per `check_interval`
+    seconds on its own connection. When the value has moved, every callback
+    registered with register_cache_invalidator() runs, so in-process caches
+    never outlive a write made by another worker for longer than the
+    interval. Writes from this process invalidate their own entries and
+    report the versions they moved between with record_local_write(), so
+    they do not clear everything.
+    """
+
+    def __init__(self, database: str, check_interval: float = COHERENCE_CHECK_INTERVAL) -> None:
+        self.database = database
+        self.check_interval = check_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._stats = {"checks": 0, "changes": 0}
+
+    def _read(self) -> int:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.database, check_same_thread=False)
+        row = self._conn.execute(
+            "SELECT value FROM catalog_meta WHERE key = 'catalog_version'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def version(self, force: bool = False) -> int:
+        """Current catalog version, clearing caches if it moved since the last check."""
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._version is not None
+                    and now - self._checked_at < self.check_interval):
+                return self._version
+
+            current = self._read()
+            self._checked_at = now
+            self._stats["checks"] += 1
+            changed = self._version is not None and current != self._version
+            self._version = current
+            if changed:
+                self._stats["changes"] += 1
+
+        if changed:
+            for invalidate in list(_CACHE_INVALIDATORS):
+                invalidate()
+        return current
+
+    def record_local_write(self, before: int, after: int) -> None:
+        """
+        Note a committed write from this process that moved the counter from
+        `before` to `after`. Its caches were already updated entry by entry,
+        so if nothing else changed in between the new version is simply
+        adopted; otherwise the next version() call re-reads and clears.
+        """
+        with self._lock:
+            if self._version == before:
+                self._version = after
+            else:
+                self._checked_at = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["version"] = self._version
+        return stats
+
+
+_MONITOR: Optional[CatalogVersionMonitor] = None
+_CACHE_INVALIDATORS: List[Callable[[], None]] = []
+
+
+def _catalog_monitor() -> CatalogVersionMonitor:
+    global _MONITOR
+    monitor = _MONITOR
+    if monitor is not None and monitor.database == DATABASE:
+        return monitor
+
+    _bootstrap_db_once()
+    with _POOL_LOCK:
+        if _MONITOR is None or _MONITOR.database != DATABASE:
+            if _MONITOR is not None:
+                _MONITOR.close()
+            _MONITOR = CatalogVersionMonitor(DATABASE, COHERENCE_CHECK_INTERVAL)
+        return _MONITOR
+
+
+def register_cache_invalidator(callback: Callable[[], None]) -> None:
+    """Run `callback` whenever the catalog changes (in this or another process)."""
+    if callback not in _CACHE_INVALIDATORS:
+        _CACHE_INVALIDATORS.append(callback)
+
+
+def get_catalog_version(force: bool = False) -> int:
+    """
+    Monotonic counter of catalog changes, shared by all processes using the
+    database file. Re-read at most every COHERENCE_CHECK_INTERVAL seconds
+    unless `force` is set.
+    """
+    return _catalog_monitor().version(force)
+
+
+def _read_catalog_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'catalog_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _commit_catalog_write(conn: sqlite3.Connection, before: int) -> None:
+    """
+    Commit a write transaction that changed `books`.
+
+    `before` is the catalog version read after BEGIN IMMEDIATE; the version
+    the triggers left is read before committing and both go to the monitor.
+    """
+    after = _read_catalog_version(conn)
+    conn.commit()
+    monitor = _MONITOR
+    if monitor is not None and after != before:
+        monitor.record_local_write(before, after)
+
+
+def get_coherence_stats() -> Dict:
+    """Version checks made and catalog changes detected."""
+    return _catalog_monitor().stats()
+
+
+# --------------------------
+# Book Cache
+# --------------------------
+
+# Book records keyed by id, plus an isbn -> id index for get_book_by_isbn.
+# Writes that touch a book call _invalidate_book; TTL bounds staleness from
+# writes made outside this process.
+_book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+_isbn_index = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+
+
+def configure_book_cache(size: Optional[int] = None, ttl: Optional[float] = None) -> None:
+    """Replace the book cache with an empty one using the given limits."""
+    global BOOK_CACHE_SIZE, BOOK_CACHE_TTL, _book_cache, _isbn_index
+    if size is not None:
+        BOOK_CACHE_SIZE = size
+    if ttl is not None:
+        BOOK_CACHE_TTL = ttl
+    _book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+    _isbn_index = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+
+
+def _cache_book(book: Dict) -> None:
+    _book_cache.set(book["id"], dict(book))
+    _isbn_index.set(normalize_isbn(book["isbn"]), book["id"])
+
+
+def _invalidate_book(book_id: int) -> None:
+    _book_cache.invalidate(book_id)
+
+
+def clear_book_cache() -> None:
+    """Drop every cached book record and ISBN mapping."""
+    _book_cache.clear()
+    _isbn_index.clear()
+
+
+register_cache_invalidator(clear_book_cache)
+
+
+def get_book_cache_stats() -> Dict:
+    """Hit/miss/eviction counters for the book record cache."""
+    return _book_cache.stats()
+
+
+# --------------------------
+# Write Transactions
+# --------------------------
+
+_TXN_STATS = {"transactions": 0, "lock_wait_total_ms": 0.0, "lock_wait_max_ms": 0.0}
+_TXN_STATS_LOCK = threading.Lock()
+
+
+def _begin_immediate(conn: sqlite3.Connection) -> float:
+    """Start a write transaction and return how long we waited for the lock (ms)."""
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    waited_ms = (time.perf_counter() - started) * 1000
+    with _TXN_STATS_LOCK:
+        _TXN_STATS["transactions"] += 1
+        _TXN_STATS["lock_wait_total_ms"] += waited_ms
+        _TXN_STATS["lock_wait_max_ms"] = max(_TXN_STATS["lock_wait_max_ms"], waited_ms)
+    return waited_ms
+
+
+def get_transaction_stats() -> Dict:
+    """Count of write transactions and the time spent waiting for the write lock."""
+    with _TXN_STATS_LOCK:
+        return dict(_TXN_STATS)
 
 
 # --------------------------
@@ -130,28 +873,208 @@ def get_all_books() -> List[Dict]:
     """Get all books from the database."""
     conn = get_db_connection()
     try:
-        books = conn.execute("SELECT * FROM books ORDER BY title").fetchall()
+        books = conn.execute(f"SELECT {BOOK_COLUMNS} FROM books ORDER BY title").fetchall()
         return [dict(book) for book in books]
     finally:
         conn.close()
 
 
+def _encode_cursor(title: str, book_id: int) -> str:
+    raw = json.dumps([title, book_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        title, book_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid page cursor.")
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError("Invalid page cursor.")
+    return title, book_id
+
+
+def get_books_page(after: Optional[str] = None, limit: int = CATALOG_PAGE_SIZE) -> Dict:
+    """
+    Get one page of the catalog ordered by (title, id).
+
+    Uses keyset pagination: `after` is the opaque `next_cursor` of the
+    previous page, so every page is an index range scan no matter how deep.
+
+    Args:
+        after: cursor returned with the previous page (None for the first page)
+        limit: page size, clamped to 1..CATALOG_MAX_PAGE_SIZE
+
+    Returns:
+        dict: {'books': [...], 'next_cursor': str or None}
+
+    Raises:
+        ValueError: if `after` is not a cursor produced by this function
+    """
+    limit = max(1, min(int(limit), CATALOG_MAX_PAGE_SIZE))
+    conn = get_db_connection()
+    try:
+        if after:
+            title, book_id = _decode_cursor(after)
+            rows = conn.execute(
+                f"""
+                SELECT {BOOK_COLUMNS} FROM books
+                WHERE (title, id) > (?, ?)
+                ORDER BY title, id
+                LIMIT ?
+                """,
+                (title, book_id, limit + 1),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books ORDER BY title, id LIMIT ?", (limit + 1,)
+            ).fetchall()
+    finally:
+        conn.close()
+
+    books = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = books[-1]
+        next_cursor = _encode_cursor(last["title"], last["id"])
+    return {"books": books, "next_cursor": next_cursor}
+
+
+def iter_books(batch_size: int = 1000) -> Iterator[Dict]:
+    """
+    Yield every book ordered by id, holding at most one batch in memory.
+
+    Each batch is its own short `id > last_id` query and the connection goes
+    back to the pool in between, so a slow consumer never keeps a read lock
+    open on the database for the whole export.
+    """
+    last_id = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for row in rows:
+            yield dict(row)
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
+
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
+    """Get a specific book by ID (served from the book cache when possible)."""
+    get_catalog_version()
+    cached = _book_cache.get(book_id)
+    if cached is not None:
+        return dict(cached)
+
     conn = get_db_connection()
     try:
-        book = conn.execute("SELECT * FROM books WHERE id = ?", (book_id,)).fetchone()
-        return dict(book) if book else None
+        book = conn.execute(f"SELECT {BOOK_COLUMNS} FROM books WHERE id = ?", (book_id,)).fetchone()
     finally:
         conn.close()
+    if not book:
+        return None
+    book = dict(book)
+    _cache_book(book)
+    return dict(book)
+
+
+def normalize_isbn(isbn: str) -> str:
+    """
+    ISBN as stored in books.isbn_normalized: hyphens and spaces removed.
+    Keep in step with the column's generated expression (migration 14).
+    """
+    return (isbn or "").replace("-", "").replace(" ", "")
 
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
+    """
+    Get a specific book by ISBN, ignoring hyphens and spaces
+    (served from the book cache when possible).
+    """
+    get_catalog_version()
+    key = normalize_isbn(isbn)
+    book_id = _isbn_index.get(key)
+    if book_id is not None:
+        cached = _book_cache.get(book_id)
+        if cached is not None and normalize_isbn(cached["isbn"]) == key:
+            return dict(cached)
+
+    conn = get_db_connection()
+    try:
+        # An exact match wins if two stored ISBNs normalize the same.
+        book = conn.execute(
+            f"""
+            SELECT {BOOK_COLUMNS} FROM books
+            WHERE isbn_normalized = ?
+            ORDER BY isbn = ? DESC, id
+            LIMIT 1
+            """,
+            (key, isbn),
+        ).fetchone()
+    finally:
+        conn.close()
+    if not book:
+        return None
+    book = dict(book)
+    _cache_book(book)
+    return dict(book)
+
+
+# Trigrams need three characters; shorter terms can't be looked up in books_fts.
+TRIGRAM_MIN_LENGTH = 3
+
+
+def search_books_fts(
+    term: str, field: str, limit: int = SEARCH_RESULT_LIMIT
+) -> Optional[List[Dict]]:
+    """
+    Substring search on title or author through the books_fts trigram index.
+
+    `term` may occur anywhere in `field` (case-insensitive), so "ockingb"
+    finds "To Kill a Mockingbird". Candidates from the index are checked
+    against the field before being returned.
+
+    Returns:
+        list of matching books, best first, or None when the index cannot
+        answer (term shorter than TRIGRAM_MIN_LENGTH, or no books_fts because
+        this SQLite lacks FTS5 or the trigram tokenizer; see FTS_MIGRATIONS)
+        and the caller should scan instead
+    """
+    if field not in ("title", "author"):
+        return []
+    needle = term.strip().lower()
+    if len(needle) < TRIGRAM_MIN_LENGTH:
+        return None
+
+    query = f'{field} : "' + needle.replace('"', '""') + '"'
     conn = get_db_connection()
     try:
-        book = conn.execute("SELECT * FROM books WHERE isbn = ?", (isbn,)).fetchone()
-        return dict(book) if book else None
+        books = []
+        for book in conn.execute(
+            """
+            SELECT b.id, b.title, b.author, b.isbn, b.total_copies, b.available_copies
+            FROM books_fts
+            JOIN books b ON b.id = books_fts.rowid
+            WHERE books_fts MATCH ?
+            ORDER BY books_fts.rank
+            """,
+            (query,),
+        ):
+            if needle in (book[field] or "").lower():
+                books.append(dict(book))
+                if len(books) >= limit:
+                    break
+        return books
+    except sqlite3.OperationalError:
+        return None
     finally:
         conn.close()
 
@@ -175,6 +1098,7 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
         for r in records:
             borrowed_books.append(
                 {
+                    "borrow_record_id": r["id"],
                     "book_id": r["book_id"],
                     "title": r["title"],
                     "author": r["author"],
@@ -188,6 +1112,101 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
         conn.close()
 
 
+def get_open_loans(
+    patron_id: Optional[str] = None,
+    book_id: Optional[int] = None,
+    due_before: Optional[datetime] = None,
+) -> List[Dict]:
+    """
+    Get open (unreturned) borrow records, optionally filtered.
+
+    Args:
+        patron_id: only this patron's loans
+        book_id: only loans of this book
+        due_before: only loans due before this moment (i.e. overdue)
+
+    Returns:
+        list: dicts with id, patron_id, book_id, borrow_date and due_date
+        (dates as datetime)
+    """
+    clauses = ["return_date IS NULL"]
+    params: List = []
+    if patron_id is not None:
+        clauses.append("patron_id = ?")
+        params.append(patron_id)
+    if book_id is not None:
+        clauses.append("book_id = ?")
+        params.append(book_id)
+    if due_before is not None:
+        clauses.append("due_date < ?")
+        params.append(due_before.isoformat())
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            f"""
+            SELECT id, patron_id, book_id, borrow_date, due_date
+            FROM borrow_records
+            WHERE {" AND ".join(clauses)}
+            ORDER BY due_date
+            """,
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        {
+            "id": r["id"],
+            "patron_id": r["patron_id"],
+            "book_id": r["book_id"],
+            "borrow_date": datetime.fromisoformat(r["borrow_date"]),
+            "due_date": datetime.fromisoformat(r["due_date"]),
+        }
+        for r in rows
+    ]
+
+
+def get_patron_history(patron_id: str, limit: int = 20) -> Tuple[List[Dict], int]:
+    """
+    Get a patron's most recent borrow records (returned or not) and the
+    total number of records they have, in one query.
+
+    Returns:
+        tuple: (records newest first, at most `limit` of them; total count)
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date,
+                   br.return_date,
+                   (SELECT COUNT(*) FROM borrow_records WHERE patron_id = ?) AS total
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id = ?
+            ORDER BY br.borrow_date DESC
+            LIMIT ?
+            """,
+            (patron_id, patron_id, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    history = [
+        {
+            "book_id": r["book_id"],
+            "title": r["title"],
+            "author": r["author"],
+            "borrow_date": datetime.fromisoformat(r["borrow_date"]),
+            "due_date": datetime.fromisoformat(r["due_date"]),
+            "return_date": datetime.fromisoformat(r["return_date"]) if r["return_date"] else None,
+        }
+        for r in rows
+    ]
+    return history, (int(rows[0]["total"]) if rows else 0)
+
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
     conn = get_db_connection()
@@ -211,6 +1230,8 @@ def insert_book(
     """Insert a new book into the database."""
     conn = get_db_connection()
     try:
+        _begin_immediate(conn)
+        version = _read_catalog_version(conn)
         conn.execute(
             """
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
@@ -218,15 +1239,57 @@ def insert_book(
             """,
             (title, author, isbn, total_copies, available_copies),
         )
-        conn.commit()
+        _commit_catalog_write(conn, version)
         return True
     except Exception:
         return False
     finally:
         conn.close()
+        _isbn_index.invalidate(normalize_isbn(isbn))
 
 
-def insert_borrow_record(
+def insert_books_bulk(books: List[Tuple[str, str, str, int, int]]) -> Optional[List[str]]:
+    """
+    Insert many books in one transaction, skipping ISBNs already in the catalog.
+
+    Args:
+        books: (title, author, isbn, total_copies, available_copies) tuples
+
+    Returns:
+        list: ISBNs that were skipped as duplicates, or None on database error
+    """
+    if not books:
+        return []
+    conn = get_db_connection()
+    try:
+        _begin_immediate(conn)
+        version = _read_catalog_version(conn)
+        isbns = [book[2] for book in books]
+        placeholders = ", ".join("?" * len(isbns))
+        existing = {
+            row["isbn"]
+            for row in conn.execute(
+                f"SELECT isbn FROM books WHERE isbn IN ({placeholders})", isbns
+            )
+        }
+        conn.executemany(
+            """
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [book for book in books if book[2] not in existing],
+        )
+        _commit_catalog_write(conn, version)
+        return [isbn for isbn in isbns if isbn in existing]
+    except Exception:
+        return None
+    finally:
+        conn.close()
+        for book in books:
+            _isbn_index.invalidate(normalize_isbn(book[2]))
+
+
+def insert_borrow_record(
     patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime
 ) -> bool:
     """Insert a new borrow record into the database."""
@@ -247,6 +1310,142 @@ def insert_borrow_record(
         conn.close()
 
 
+def borrow_book_atomic(
+    patron_id: str,
+    book_id: int,
+    borrow_date: datetime,
+    due_date: datetime,
+    max_active_loans: int,
+) -> Dict:
+    """
+    Check out one copy of a book in a single write transaction.
+
+    The availability and loan-count checks, the decrement and the new borrow
+    record all happen under one BEGIN IMMEDIATE lock on one connection, so
+    concurrent checkouts cannot oversell the last copy.
+
+    Args:
+        max_active_loans: reject when the patron already has more loans than this
+
+    Returns:
+        dict: 'status' is one of 'ok', 'not_found', 'unavailable', 'limit' or
+        'error'; 'title' is the book title when found; 'lock_wait_ms' is the
+        time spent waiting for the write lock.
+    """
+    result: Dict = {"status": "error", "title": None, "lock_wait_ms": 0.0}
+    conn = get_db_connection()
+    try:
+        result["lock_wait_ms"] = _begin_immediate(conn)
+        version = _read_catalog_version(conn)
+        book = conn.execute(
+            """
+            SELECT b.title, b.available_copies,
+                   (SELECT COUNT(*) FROM borrow_records
+                    WHERE patron_id = ? AND return_date IS NULL) AS active_loans
+            FROM books b
+            WHERE b.id = ?
+            """,
+            (patron_id, book_id),
+        ).fetchone()
+        if book is None:
+            result["status"] = "not_found"
+            return result
+
+        result["title"] = book["title"]
+        if book["available_copies"] <= 0:
+            result["status"] = "unavailable"
+            return result
+        if book["active_loans"] > max_active_loans:
+            result["status"] = "limit"
+            return result
+
+        updated = conn.execute(
+            """
+            UPDATE books SET available_copies = available_copies - 1
+            WHERE id = ? AND available_copies > 0
+            """,
+            (book_id,),
+        )
+        if updated.rowcount != 1:
+            result["status"] = "unavailable"
+            return result
+
+        conn.execute(
+            """
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+            VALUES (?, ?, ?, ?)
+            """,
+            (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()),
+        )
+        _commit_catalog_write(conn, version)
+        result["status"] = "ok"
+        return result
+    except Exception:
+        result["status"] = "error"
+        return result
+    finally:
+        conn.close()
+        _invalidate_book(book_id)
+
+
+def return_book_atomic(patron_id: str, book_id: int, return_date: datetime) -> Dict:
+    """
+    Close a patron's open loan of a book in a single write transaction.
+
+    Sets the return date, puts the copy back on the shelf and reads the
+    loan's due date in the same BEGIN IMMEDIATE transaction, so the caller
+    can work out the late fee without another query.
+
+    Returns:
+        dict: 'status' is 'ok', 'not_found', 'no_loan' (the patron has no
+        open loan of this book) or 'error'; 'title' is the book title;
+        'due_date' is the due date of the closed loan; 'loans' lists the
+        closed loans' id and due_date; 'lock_wait_ms' as for
+        borrow_book_atomic.
+    """
+    result: Dict = {"status": "error", "title": None, "due_date": None, "loans": [], "lock_wait_ms": 0.0}
+    conn = get_db_connection()
+    try:
+        result["lock_wait_ms"] = _begin_immediate(conn)
+        version = _read_catalog_version(conn)
+        book = conn.execute("SELECT title FROM books WHERE id = ?", (book_id,)).fetchone()
+        if book is None:
+            result["status"] = "not_found"
+            return result
+        result["title"] = book["title"]
+
+        closed = conn.execute(
+            """
+            UPDATE borrow_records
+            SET return_date = ?
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            RETURNING id, due_date
+            """,
+            (return_date.isoformat(), patron_id, book_id),
+        ).fetchall()
+        if not closed:
+            result["status"] = "no_loan"
+            return result
+        conn.execute(
+            "UPDATE books SET available_copies = available_copies + ? WHERE id = ?",
+            (len(closed), book_id),
+        )
+        result["loans"] = [
+            {"id": r["id"], "due_date": datetime.fromisoformat(r["due_date"])} for r in closed
+        ]
+        result["due_date"] = min(loan["due_date"] for loan in result["loans"])
+
+        _commit_catalog_write(conn, version)
+        result["status"] = "ok"
+        return result
+    except Exception:
+        result["status"] = "error"
+        return result
+    finally:
+        conn.close()
+        _invalidate_book(book_id)
+
+
 def update_book_availability(book_id: int, change: int) -> bool:
     """
     Update the available copies of a book by a given amount
@@ -254,16 +1453,19 @@ def update_book_availability(book_id: int, change: int) -> bool:
     """
     conn = get_db_connection()
     try:
+        _begin_immediate(conn)
+        version = _read_catalog_version(conn)
         conn.execute(
             "UPDATE books SET available_copies = available_copies + ? WHERE id = ?",
             (change, book_id),
         )
-        conn.commit()
+        _commit_catalog_write(conn, version)
         return True
     except Exception:
         return False
     finally:
         conn.close()
+        _invalidate_book(book_id)
 
 
 def update_borrow_record_return_date(
@@ -286,3 +1488,380 @@ def update_borrow_record_return_date(
         return False
     finally:
         conn.close()
+
+
+def record_fee_payment_items(
+    transaction_id: str,
+    patron_id: str,
+    items: List[Tuple[int, int, float]],
+    paid_at: datetime,
+) -> bool:
+    """
+    Record which loans a late fee charge paid for.
+
+    Args:
+        items: (borrow_record_id, book_id, amount) for each loan in the charge
+    """
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            """
+            INSERT INTO fee_payment_items
+                (transaction_id, patron_id, borrow_record_id, book_id, amount, paid_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (transaction_id, patron_id, record_id, book_id, amount, paid_at.isoformat())
+                for record_id, book_id, amount in items
+            ],
+        )
+        conn.commit()
+        return True
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def get_fees_paid_by_loan(patron_id: str) -> Dict[int, float]:
+    """Total late fees already paid per borrow record for a patron."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT borrow_record_id, SUM(amount) AS paid
+            FROM fee_payment_items
+            WHERE patron_id = ?
+            GROUP BY borrow_record_id
+            """,
+            (patron_id,),
+        ).fetchall()
+        return {r["borrow_record_id"]: float(r["paid"]) for r in rows}
+    finally:
+        conn.close()
+
+
+def get_fee_payment_item(transaction_id: str, book_id: int) -> Optional[Dict]:
+    """Get the line of a late fee charge that paid for a given book."""
+    conn = get_db_connection()
+    try:
+        item = conn.execute(
+            """
+            SELECT * FROM fee_payment_items
+            WHERE transaction_id = ? AND book_id = ?
+            ORDER BY id
+            LIMIT 1
+            """,
+            (transaction_id, book_id),
+        ).fetchone()
+        return dict(item) if item else None
+    finally:
+        conn.close()
+
+
+def add_fee_item_refund(item_id: int, amount: float) -> bool:
+    """
+    Add a refund to a fee payment line, refusing to refund more than was paid.
+
+    The check and the update are one statement, so callers reserve the
+    amount with this before asking the gateway and two concurrent refunds
+    of the same line cannot both pass; see release_fee_item_refund().
+    """
+    conn = get_db_connection()
+    try:
+        updated = conn.execute(
+            """
+            UPDATE fee_payment_items
+            SET refunded_amount = refunded_amount + ?
+            WHERE id = ? AND refunded_amount + ? <= amount + 0.005
+            """,
+            (amount, item_id, amount),
+        )
+        conn.commit()
+        return updated.rowcount == 1
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def release_fee_item_refund(item_id: int, amount: float) -> bool:
+    """Give back an amount reserved by add_fee_item_refund() when the refund did not go through."""
+    conn = get_db_connection()
+    try:
+        updated = conn.execute(
+            """
+            UPDATE fee_payment_items
+            SET refunded_amount = MAX(refunded_amount - ?, 0)
+            WHERE id = ?
+            """,
+            (amount, item_id),
+        )
+        conn.commit()
+        return updated.rowcount == 1
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def _payment_job_row(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def _find_conflicting_job(conn: sqlite3.Connection, dedupe_key: str) -> Optional[int]:
+    """
+    Id of a queued or running job whose key equals `dedupe_key`, is one of
+    its ':'-separated prefixes, or extends it ('payment:123456' conflicts
+    with 'payment:123456:7' both ways, not with 'payment:123456:8' ...).
+    """
+    parts = dedupe_key.split(":")
+    prefixes = [":".join(parts[:n]) for n in range(1, len(parts) + 1)]
+    marks = ", ".join("?" for _ in prefixes)
+    row = conn.execute(
+        f"""
+        SELECT id FROM payment_jobs
+        WHERE status IN ('queued', 'running')
+          AND (dedupe_key IN ({marks}) OR (dedupe_key > ? AND dedupe_key < ?))
+        ORDER BY id
+        LIMIT 1
+        """,
+        (*prefixes, dedupe_key + ":", dedupe_key + ";"),
+    ).fetchone()
+    return row["id"] if row else None
+
+
+def enqueue_payment_job(kind: str, payload: Dict, dedupe_key: Optional[str] = None) -> Optional[int]:
+    """
+    Queue a 'payment' or 'refund' job; return its id (None on failure).
+
+    With `dedupe_key` set, the job is refused (None) while a queued or
+    running job holds the same key, a prefix of it or an extension of it,
+    so a patron-wide key excludes that patron's per-book keys and vice
+    versa; see get_active_payment_job().
+    """
+    conn = get_db_connection()
+    try:
+        _begin_immediate(conn)
+        try:
+            if dedupe_key is not None and _find_conflicting_job(conn, dedupe_key) is not None:
+                conn.rollback()
+                return None
+            cur = conn.execute(
+                "INSERT INTO payment_jobs (kind, payload, created_at, dedupe_key) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload), datetime.now().isoformat(), dedupe_key),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cur.lastrowid
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+def get_active_payment_job(dedupe_key: str) -> Optional[int]:
+    """Id of the queued or running job that `dedupe_key` conflicts with, if any."""
+    conn = get_db_connection()
+    try:
+        return _find_conflicting_job(conn, dedupe_key)
+    finally:
+        conn.close()
+
+
+def get_payment_job_counts() -> Dict[str, int]:
+    """
+    Number of queued and running payment jobs.
+
+    Both counts come from the partial indexes over unfinished jobs, so the
+    cost follows the backlog, not the size of the job history.
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM payment_jobs WHERE status = 'queued') AS queued,
+                (SELECT COUNT(*) FROM payment_jobs WHERE status IN ('queued', 'running')) AS active
+            """
+        ).fetchone()
+        return {"queued": row["queued"], "running": row["active"] - row["queued"]}
+    finally:
+        conn.close()
+
+
+def claim_payment_job() -> Optional[Dict]:
+    """
+    Take the oldest queued job and mark it running.
+
+    Idle workers only pay for a read; the write lock is taken when there is
+    something to claim, so each job goes to exactly one worker.
+    """
+    conn = get_db_connection()
+    try:
+        if conn.execute("SELECT 1 FROM payment_jobs WHERE status = 'queued' LIMIT 1").fetchone() is None:
+            return None
+        _begin_immediate(conn)
+        try:
+            row = conn.execute(
+                """
+                UPDATE payment_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = ?
+                WHERE id = (
+                    SELECT id FROM payment_jobs WHERE status = 'queued' ORDER BY id LIMIT 1
+                )
+                RETURNING *
+                """,
+                (datetime.now().isoformat(),),
+            ).fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return _payment_job_row(row) if row else None
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+def finish_payment_job(job_id: int, succeeded: bool, result: Dict) -> bool:
+    """Store the outcome of a running job."""
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            """
+            UPDATE payment_jobs
+            SET status = ?, result = ?, finished_at = ?
+            WHERE id = ?
+            """,
+            ("succeeded" if succeeded else "failed", json.dumps(result), datetime.now().isoformat(), job_id),
+        )
+        conn.commit()
+        return True
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def fail_stale_payment_jobs(started_before: datetime) -> int:
+    """
+    Mark jobs left 'running' by a crashed worker as failed.
+
+    They are not retried automatically: the gateway may already have
+    charged the patron, so a person has to look at them.
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.execute(
+            """
+            UPDATE payment_jobs
+            SET status = 'failed', result = ?, finished_at = ?
+            WHERE status = 'running' AND started_at < ?
+            """,
+            (
+                json.dumps({"success": False, "message": "Worker stopped before the job finished."}),
+                datetime.now().isoformat(),
+                started_before.isoformat(),
+            ),
+        )
+        conn.commit()
+        return cur.rowcount
+    except Exception:
+        return 0
+    finally:
+        conn.close()
+
+
+def get_payment_job(job_id: int) -> Optional[Dict]:
+    """Get a payment job by ID."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM payment_jobs WHERE id = ?", (job_id,)).fetchone()
+        return _payment_job_row(row) if row else None
+    finally:
+        conn.close()
+
+
+def record_payment_transaction(
+    transaction_id: str,
+    status: str,
+    patron_id: Optional[str] = None,
+    amount: Optional[float] = None,
+) -> bool:
+    """
+    Insert or update a transaction in the payment ledger.
+
+    patron_id and amount keep their stored values when passed as None.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            """
+            INSERT INTO payment_transactions (transaction_id, patron_id, amount, status, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (transaction_id) DO UPDATE SET
+                patron_id = COALESCE(excluded.patron_id, patron_id),
+                amount = COALESCE(excluded.amount, amount),
+                status = excluded.status,
+                updated_at = excluded.updated_at
+            """,
+            (transaction_id, patron_id, amount, status, datetime.now().isoformat()),
+        )
+        conn.commit()
+        return True
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def add_payment_transaction_refund(transaction_id: str, amount: float) -> Optional[str]:
+    """
+    Add a refund to a transaction's running refund total in the ledger.
+
+    The status becomes 'refunded' once the total reaches the charged amount,
+    and 'partially_refunded' before that or while the charged amount is
+    unknown. Returns the new status (None on database error).
+    """
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            INSERT INTO payment_transactions (transaction_id, status, refunded_amount, updated_at)
+            VALUES (?, 'partially_refunded', ?, ?)
+            ON CONFLICT (transaction_id) DO UPDATE SET
+                refunded_amount = refunded_amount + excluded.refunded_amount,
+                status = CASE
+                    WHEN amount IS NOT NULL
+                         AND refunded_amount + excluded.refunded_amount >= amount - 0.005
+                    THEN 'refunded' ELSE 'partially_refunded' END,
+                updated_at = excluded.updated_at
+            RETURNING status
+            """,
+            (transaction_id, amount, datetime.now().isoformat()),
+        ).fetchone()
+        conn.commit()
+        return row["status"]
+    except Exception:
+        return None
+    finally:
+        conn.close()
+
+
+def get_payment_transaction(transaction_id: str) -> Optional[Dict]:
+    """Get a transaction from the payment ledger."""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT * FROM payment_transactions WHERE transaction_id = ?", (transaction_id,)
+        ).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
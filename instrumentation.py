@@ -0,0 +1,229 @@
+"""
+Request and SQL instrumentation.
+
+While a request (or any `track()` block) is active, pooled database
+connections report each statement's execution time and the rows fetched,
+and other layers can add named timings (the payment gateway does). At the
+end of a Flask request the totals go out as a Server-Timing header and one
+structured log line; statements slower than SLOW_QUERY_MS are logged on
+their own.
+"""
+
+import contextvars
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import metrics
+
+SLOW_QUERY_MS = 100.0
+
+REQUEST_LATENCY = metrics.Histogram(
+    'library_request_duration_seconds',
+    'HTTP request latency by blueprint and status class.',
+    ('blueprint', 'status'),
+)
+
+request_log = logging.getLogger("library.request")
+slow_query_log = logging.getLogger("library.sql.slow")
+
+
+class RequestStats:
+    """Wall time, SQL totals and named timings collected for one unit of work."""
+
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS):
+        self.started = time.perf_counter()
+        self.slow_query_ms = slow_query_ms
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.sql_rows = 0
+        self.slow_queries = 0
+        self.timings: Dict[str, float] = {}
+
+    def add_timing(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> Dict:
+        return {
+            'duration_ms': round(self.elapsed() * 1000, 3),
+            'sql_statements': self.sql_statements,
+            'sql_ms': round(self.sql_seconds * 1000, 3),
+            'sql_rows': self.sql_rows,
+            'slow_queries': self.slow_queries,
+            **{f'{name}_ms': round(seconds * 1000, 3) for name, seconds in self.timings.items()},
+        }
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@contextmanager
+def track(slow_query_ms: float = SLOW_QUERY_MS) -> Iterator[RequestStats]:
+    """Collect statistics for the enclosed block (outside Flask: workers, scripts)."""
+    stats = RequestStats(slow_query_ms)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def add_timing(name: str, seconds: float) -> None:
+    """Add time spent in `name` (e.g. "gateway") to the current request, if any."""
+    stats = _current.get()
+    if stats is not None:
+        stats.add_timing(name, seconds)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that charges its execute and fetch time to the current stats.
+
+    Created by PooledConnection.execute only while stats are being
+    collected, so untracked code keeps the plain sqlite3 cursor.
+    """
+
+    def _charge(self, started: float, rows: int) -> None:
+        elapsed = time.perf_counter() - started
+        stats = self._stats
+        stats.sql_seconds += elapsed
+        stats.sql_rows += rows
+        self._elapsed += elapsed
+        if not self._reported_slow and self._elapsed * 1000 >= stats.slow_query_ms:
+            self._reported_slow = True
+            stats.slow_queries += 1
+            slow_query_log.warning(json.dumps({
+                'event': 'slow_query',
+                'duration_ms': round(self._elapsed * 1000, 3),
+                'sql': " ".join(self._sql.split()),
+            }))
+
+    def _start(self, stats: RequestStats, sql: str) -> None:
+        self._stats = stats
+        self._sql = sql
+        self._elapsed = 0.0
+        self._reported_slow = False
+        stats.sql_statements += 1
+
+    def execute(self, sql, parameters=()):
+        self._start(_current.get(), sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._charge(started, 0)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(_current.get(), sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._charge(started, 0)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._charge(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._charge(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._charge(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._charge(started, 0)
+            raise
+        self._charge(started, 1)
+        return row
+
+
+def server_timing(stats: RequestStats) -> str:
+    """Server-Timing header value: db and other named timings plus the total."""
+    parts = [f'db;dur={stats.sql_seconds * 1000:.3f};desc="{stats.sql_statements} queries"']
+    parts += [f'{name};dur={seconds * 1000:.3f}' for name, seconds in stats.timings.items()]
+    parts.append(f'total;dur={stats.elapsed() * 1000:.3f}')
+    return ", ".join(parts)
+
+
+def init_app(app) -> None:
+    """
+    Time every request of a Flask app and feed the per-blueprint latency histogram.
+
+    Config:
+        INSTRUMENTATION: set False to turn it off (default True)
+        SLOW_QUERY_MS: log statements slower than this (default 100)
+    """
+    from flask import g, request, template_rendered, before_render_template
+
+    app.config.setdefault('INSTRUMENTATION', True)
+    app.config.setdefault('SLOW_QUERY_MS', SLOW_QUERY_MS)
+
+    @app.before_request
+    def _start_request_stats():
+        g._request_started = time.perf_counter()
+        if app.config['INSTRUMENTATION']:
+            g._request_stats = RequestStats(app.config['SLOW_QUERY_MS'])
+            _current.set(g._request_stats)
+
+    @app.after_request
+    def _finish_request_stats(response):
+        started = g.get('_request_started')
+        if started is not None:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                blueprint=request.blueprint or 'none',
+                status=f'{response.status_code // 100}xx',
+            )
+        stats = g.get('_request_stats')
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = server_timing(stats)
+        request_log.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'blueprint': request.blueprint,
+            'status': response.status_code,
+            **stats.summary(),
+        }))
+        return response
+
+    @app.teardown_request
+    def _clear_request_stats(exc):
+        if g.pop('_request_stats', None) is not None:
+            _current.set(None)
+
+    def _template_started(sender, template, context, **extra):
+        g._template_started = time.perf_counter()
+
+    def _template_finished(sender, template, context, **extra):
+        started = g.pop('_template_started', None)
+        if started is not None:
+            add_timing('render', time.perf_counter() - started)
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
@@ -0,0 +1,153 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are created at import time by the modules that
+update them and live in one registry. Values that already exist elsewhere
+(pool, cache and gateway statistics) are read at scrape time by collector
+functions instead of being copied on every change. GET /metrics renders
+everything with render().
+"""
+
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) pairs for one metric
+Samples = List[Tuple[Dict[str, str], float]]
+# (name, type, help, samples) produced by a collector at scrape time
+Family = Tuple[str, str, str, Samples]
+
+_METRICS: List["_Metric"] = []
+_COLLECTORS: List[Callable[[], Iterable[Family]]] = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _REGISTRY_LOCK:
+            _METRICS.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Sample lines of this metric (without HELP/TYPE)."""
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(dict(zip(self.labelnames, key)))} {_number(v)}" for key, v in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Add a function that returns (name, type, help, samples) families at scrape time."""
+    with _REGISTRY_LOCK:
+        _COLLECTORS.append(collector)
+
+
+def render() -> str:
+    """Every registered metric and collected family in Prometheus text format."""
+    with _REGISTRY_LOCK:
+        metrics = list(_METRICS)
+        collectors = list(_COLLECTORS)
+
+    lines = []
+    for metric in metrics:
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+        lines += metric.render()
+    for collector in collectors:
+        for name, kind, help, samples in collector():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
@@ -2,8 +2,18 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+import csv
+import json
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from database import get_books_page, iter_books, BOOK_EXPORT_COLUMNS, CATALOG_PAGE_SIZE
+from services.library_service import (
+    bulk_add_books, calculate_late_fee_for_book, get_payment_status, search_books_in_catalog
+)
+from services.payment_jobs import (
+    get_job_status, start_payment_workers, submit_pay_all, submit_payment, submit_refund
+)
+from services.payment_service import PaymentGateway
+from .conditional import catalog_conditional
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -16,7 +26,159 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List catalog books one page at a time, ordered by title.
+    API interface for R2: Book Catalog Display
+
+    Pass the returned `next_cursor` as `after` to fetch the following page.
+    """
+    after = request.args.get('after') or None
+    limit = request.args.get('limit', CATALOG_PAGE_SIZE, type=int)
+
+    try:
+        page = get_books_page(after, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'books': page['books'],
+        'next_cursor': page['next_cursor'],
+        'count': len(page['books'])
+    })
+
+class _Echo:
+    """File-like object whose write() hands the line straight back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+def _export_ndjson():
+    for book in iter_books():
+        yield json.dumps(book) + '\n'
+
+def _export_csv():
+    writer = csv.writer(_Echo())
+    yield writer.writerow(BOOK_EXPORT_COLUMNS)
+    for book in iter_books():
+        yield writer.writerow([book[col] for col in BOOK_EXPORT_COLUMNS])
+
+@api_bp.route('/books/export')
+def export_books_api():
+    """
+    Stream the whole catalog as NDJSON (default) or CSV.
+    Rows are generated batch by batch, so memory stays flat for any catalog size.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+
+    if export_format == 'ndjson':
+        rows, mimetype = _export_ndjson(), 'application/x-ndjson'
+    elif export_format == 'csv':
+        rows, mimetype = _export_csv(), 'text/csv'
+    else:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    return Response(
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=books.{export_format}'}
+    )
+
+@api_bp.route('/books/import', methods=['POST'])
+def import_books_api():
+    """
+    Add many books in one request.
+    Bulk interface for R1: Book Catalog Management
+
+    Body: {"books": [{"title", "author", "isbn", "total_copies"}, ...]}
+    """
+    payload = request.get_json(silent=True) or {}
+    books = payload.get('books')
+
+    if not isinstance(books, list) or not all(isinstance(b, dict) for b in books):
+        return jsonify({'error': 'Body must be {"books": [...]} with one object per book'}), 400
+
+    return jsonify(bulk_add_books(books))
+
+def _ensure_payment_workers():
+    """Start the in-process payment workers on first use (PAYMENT_WORKERS=0 leaves it to `python -m services.payment_jobs`)."""
+    url = current_app.config.get('PAYMENT_GATEWAY_URL')
+    start_payment_workers(
+        current_app.config.get('PAYMENT_WORKERS', 0),
+        gateway_factory=(lambda: PaymentGateway(base_url=url)) if url else None
+    )
+
+def _queued_response(success, message, job_id):
+    if not success and job_id is None:
+        return jsonify({'success': False, 'message': message}), 400
+    # A refused duplicate still points the client at the job already in progress
+    return jsonify({
+        'success': success,
+        'message': message,
+        'job_id': job_id,
+        'status_url': f'/api/payments/{job_id}'
+    }), 202 if success else 409
+
+@api_bp.route('/payments', methods=['POST'])
+def queue_payment_api():
+    """
+    Queue a late fee payment for one book; poll status_url for the outcome.
+    Body: {"patron_id": "123456", "book_id": 1}
+    """
+    data = request.get_json(silent=True) or {}
+    book_id = data.get('book_id')
+    if not isinstance(book_id, int):
+        return jsonify({'success': False, 'message': 'book_id must be an integer.'}), 400
+
+    _ensure_payment_workers()
+    return _queued_response(*submit_payment(str(data.get('patron_id') or ''), book_id))
+
+@api_bp.route('/late_fees/<patron_id>/pay', methods=['POST'])
+def pay_all_late_fees_api(patron_id):
+    """
+    Queue one itemized charge of all of a patron's outstanding late fees;
+    poll status_url for the outcome.
+    """
+    _ensure_payment_workers()
+    return _queued_response(*submit_pay_all(patron_id))
+
+@api_bp.route('/refunds', methods=['POST'])
+def queue_refund_api():
+    """
+    Queue a refund of a late fee payment; poll status_url for the outcome.
+    Body: {"transaction_id": "txn_...", "amount": 2.5, "book_id": 1 (optional)}
+    """
+    data = request.get_json(silent=True) or {}
+    amount = data.get('amount')
+    book_id = data.get('book_id')
+    if not isinstance(amount, (int, float)) or (book_id is not None and not isinstance(book_id, int)):
+        return jsonify({'success': False, 'message': 'amount must be a number and book_id an integer.'}), 400
+
+    _ensure_payment_workers()
+    return _queued_response(*submit_refund(str(data.get('transaction_id') or ''), float(amount), book_id))
+
+@api_bp.route('/payments/<int:job_id>')
+def payment_job_status_api(job_id):
+    """
+    Status of a queued payment or refund: queued, running, succeeded or failed.
+    """
+    status = get_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@api_bp.route('/transactions/<transaction_id>')
+def payment_status_api(transaction_id):
+    """
+    Status of a gateway transaction; settled ones are served from the local ledger.
+    """
+    url = current_app.config.get('PAYMENT_GATEWAY_URL')
+    status = get_payment_status(transaction_id, PaymentGateway(base_url=url) if url else None)
+    return jsonify(status), 404 if status.get('status') == 'not_found' else 200
+
 @api_bp.route('/search')
+@catalog_conditional
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -3,8 +3,9 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from library_service import add_book_to_catalog
+from database import get_books_page, CATALOG_PAGE_SIZE
+from services.library_service import add_book_to_catalog
+from .conditional import catalog_conditional
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +15,26 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_conditional
 def catalog():
     """
-    Display all books in the catalog.
+    Display the catalog one page at a time.
     Implements R2: Book Catalog Display
+
+    Query params `after` (cursor of the previous page) and `limit` select the page.
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    after = request.args.get('after') or None
+    limit = request.args.get('limit', CATALOG_PAGE_SIZE, type=int)
+
+    try:
+        page = get_books_page(after, limit)
+    except ValueError as e:
+        flash(str(e), 'error')
+        after = None
+        page = get_books_page(None, limit)
+
+    return render_template('catalog.html', books=page['books'],
+                           next_cursor=page['next_cursor'], after=after, limit=limit)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
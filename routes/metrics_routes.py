@@ -0,0 +1,89 @@
+"""
+Metrics Routes - Prometheus scrape endpoint
+"""
+
+from flask import Blueprint, Response
+import database
+import metrics
+from services.library_service import get_payment_status_cache_stats, get_search_cache_stats
+from services.payment_service import get_gateway_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _cache_family(stats, cache):
+    labels = {'cache': cache}
+    return [
+        (name, kind, help, [(labels, stats[key])])
+        for name, key, kind, help in (
+            ('library_cache_hits_total', 'hits', 'counter', 'Cache lookups answered from memory.'),
+            ('library_cache_misses_total', 'misses', 'counter', 'Cache lookups that went to the database.'),
+            ('library_cache_evictions_total', 'evictions', 'counter', 'Entries dropped to stay within max size.'),
+            ('library_cache_entries', 'size', 'gauge', 'Entries currently cached.'),
+        )
+    ]
+
+
+def collect_database():
+    """Connection pool, write transactions, catalog coherence and payment queue."""
+    pool = database.get_pool_stats()
+    txn = database.get_transaction_stats()
+    coherence = database.get_coherence_stats()
+    families = [
+        ('library_db_pool_connections', 'gauge', 'Pooled connections by state.',
+         [({'state': 'in_use'}, pool['in_use']), ({'state': 'idle'}, pool['idle'])]),
+        ('library_db_pool_size', 'gauge', 'Maximum pooled connections.', [({}, pool['size'])]),
+        ('library_db_pool_events_total', 'counter', 'Pool checkouts by kind.',
+         [({'event': key}, pool[key]) for key in ('created', 'reused', 'waits', 'timeouts', 'discarded')]),
+        ('library_db_write_transactions_total', 'counter', 'BEGIN IMMEDIATE transactions started.',
+         [({}, txn['transactions'])]),
+        ('library_db_lock_wait_seconds_total', 'counter', 'Time spent waiting for the write lock.',
+         [({}, txn['lock_wait_total_ms'] / 1000)]),
+        ('library_catalog_version', 'gauge', 'Current catalog version.', [({}, coherence['version'] or 0)]),
+        ('library_catalog_changes_total', 'counter', 'Catalog changes seen by this process.',
+         [({}, coherence['changes'])]),
+    ]
+
+    jobs = database.get_payment_job_counts()
+    families.append(('library_payment_jobs', 'gauge', 'Unfinished payment jobs by status.',
+                     [({'status': status}, n) for status, n in jobs.items()]))
+    return families
+
+
+def collect_caches():
+    return (_cache_family(database.get_book_cache_stats(), 'book')
+            + _cache_family(get_payment_status_cache_stats(), 'payment_status')
+            + _cache_family(get_search_cache_stats(), 'search'))
+
+
+def collect_gateway():
+    snapshot = get_gateway_metrics()
+    ops = snapshot['operations']
+    return [
+        ('library_gateway_retries_total', 'counter', 'Payment gateway retries by operation.',
+         [({'operation': op}, stats['retries']) for op, stats in ops.items()]),
+        ('library_gateway_rejected_total', 'counter', 'Calls refused by an open circuit breaker.',
+         [({'operation': op}, stats['rejected']) for op, stats in ops.items()]),
+        ('library_gateway_circuit_open', 'gauge', 'Circuit breaker state (1 open, 0.5 half-open, 0 closed).',
+         [({'gateway': url}, {'open': 1, 'half_open': 0.5}.get(state, 0))
+          for url, state in snapshot['circuits'].items()]),
+    ]
+
+
+def _merge(families):
+    # Collectors may return one family in several parts (e.g. per cache); render each name once.
+    merged = {}
+    for name, kind, help, samples in families:
+        merged.setdefault(name, (name, kind, help, []))[3].extend(samples)
+    return list(merged.values())
+
+
+metrics.register_collector(lambda: _merge(collect_database() + collect_caches() + collect_gateway()))
+
+
+@metrics_bp.route('/metrics')
+def scrape():
+    """
+    All application metrics in the Prometheus text exposition format.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
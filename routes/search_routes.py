@@ -3,11 +3,13 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
-from library_service import search_books_in_catalog
+from services.library_service import search_books_in_catalog
+from .conditional import catalog_conditional
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@catalog_conditional
 def search_books():
     """
     Search for books in the catalog.
@@ -0,0 +1,57 @@
+"""
+Bulk Import CLI - Load books into the catalog from a CSV file
+
+Usage:
+    python -m services.bulk_import books.csv [--batch-size 1000] [--database library.db]
+
+The CSV needs a header row with title, author, isbn and total_copies columns.
+Rows are checked with the same R1 rules as the Add Book form.
+"""
+
+import argparse
+import csv
+import sys
+from typing import Dict, Iterator, List, Optional
+
+import database
+from services.library_service import bulk_add_books
+
+
+def read_books_csv(path: str) -> Iterator[Dict]:
+    """Yield book dicts from a CSV file, converting total_copies to int when possible."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            copies = (row.get('total_copies') or '').strip()
+            yield {
+                'title': row.get('title') or '',
+                'author': row.get('author') or '',
+                'isbn': (row.get('isbn') or '').strip(),
+                'total_copies': int(copies) if copies.isdigit() else copies,
+            }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV file.")
+    parser.add_argument('csv_file', help="CSV with title, author, isbn, total_copies columns")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows per insert transaction")
+    parser.add_argument('--database', help="SQLite file to import into (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.DATABASE = args.database
+
+    report = bulk_add_books(read_books_csv(args.csv_file), batch_size=args.batch_size)
+
+    for error in report['errors']:
+        # +2: 1-based line numbers plus the header row
+        print(f"line {error['row'] + 2}: {error['isbn'] or '-'}: {error['error']}", file=sys.stderr)
+    print(
+        f"Imported {report['inserted']} of {report['total']} rows "
+        f"({report['failed']} failed) in {report['elapsed_seconds']:.2f}s "
+        f"({report['rows_per_second']:.0f} rows/s)."
+    )
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Synthetic Data Generator - Production-scale catalogs and borrow histories
+
+Usage:
+    python -m services.generate_data big.db [--books 1000000] [--patrons 50000]
+        [--loans 3000000] [--seed 42] [--as-of 2026-01-01] [--replace]
+
+Output is deterministic for a given seed and --as-of date. Book popularity
+and patron activity follow Zipf distributions, so a few titles and patrons
+account for most loans. A fraction of loans is still open, and some of
+those are overdue; available_copies matches the open loans of each book.
+
+Secondary indexes and triggers on books and borrow_records are dropped for
+the load and recreated afterwards (the FTS index is rebuilt in one pass).
+"""
+
+import argparse
+import itertools
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import database
+
+BATCH_SIZE = 50_000
+LOAN_DAYS = 14
+MAX_ACTIVE_LOANS = 5
+# Uniform redraws allowed when an open loan's book or patron is at its limit
+OPEN_LOAN_REDRAWS = 20
+
+_SYLLABLES = [
+    "al", "ar", "be", "ca", "de", "el", "fa", "gor", "ha", "in", "jo", "ka", "lan", "ma",
+    "nor", "o", "pa", "qui", "ra", "sa", "ta", "ul", "va", "wen", "xi", "yar", "zo",
+]
+_TITLE_WORDS = [
+    "river", "shadow", "garden", "winter", "silver", "empire", "letters", "island",
+    "machine", "forest", "harbor", "kingdom", "lantern", "mirror", "orchard", "pilgrim",
+    "quarry", "rebel", "saint", "thunder", "valley", "wanderer", "yellow", "storm",
+    "night", "glass", "iron", "ocean", "memory", "daughter", "stranger", "city",
+]
+
+
+def _zipf_cum_weights(n: int, s: float) -> List[float]:
+    """Cumulative weights for ranks 1..n with weight 1/rank**s."""
+    return list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def _name(rand, parts: int) -> str:
+    return "".join(_SYLLABLES[int(rand() * len(_SYLLABLES))] for _ in range(parts)).capitalize()
+
+
+def _book_rows(rng: random.Random, books: int, authors: List[str]) -> Iterator[Tuple]:
+    # Draw with rng.random() directly: randint/choice/sample dominate the run time otherwise.
+    rand = rng.random
+    picked_authors = rng.choices(authors, cum_weights=_zipf_cum_weights(len(authors), 0.8), k=books)
+    copy_choices = (1, 1, 2, 2, 3, 5)
+    n_words = len(_TITLE_WORDS)
+    for i in range(books):
+        words = [_TITLE_WORDS[int(rand() * n_words)] for _ in range(1 + int(rand() * 3))]
+        title = " ".join(["The"] + words if rand() < 0.4 else words).title()
+        if rand() < 0.5:
+            title += f" {_name(rand, 2)}"
+        copies = copy_choices[int(rand() * 6)]
+        isbn = f"978{i:010d}"
+        yield title, picked_authors[i], isbn, copies, copies
+
+
+def _batches(rows: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _drop_secondary_objects(conn: sqlite3.Connection) -> List[str]:
+    """Drop indexes and triggers on books/borrow_records; return the SQL to recreate them."""
+    objects = conn.execute(
+        """
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name IN ('books', 'borrow_records')
+          AND type IN ('index', 'trigger') AND sql IS NOT NULL
+        """
+    ).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    return [sql for _, _, sql in objects]
+
+
+def generate_dataset(
+    books: int = 100_000,
+    patrons: int = 10_000,
+    loans: int = 300_000,
+    seed: int = 42,
+    as_of: Optional[date] = None,
+    open_fraction: float = 0.05,
+    overdue_fraction: float = 0.3,
+    history_days: int = 730,
+    zipf_s: float = 1.1,
+    replace: bool = False,
+) -> Dict:
+    """
+    Fill database.DATABASE with a synthetic catalog and borrow history.
+
+    Args:
+        open_fraction: share of loans that are still out; when the drawn book
+            has no copy left or the patron is at the borrowing limit, another
+            is drawn uniformly (the report gives the share actually reached)
+        overdue_fraction: share of open loans already past their due date
+        history_days: how far back the borrow history goes
+        zipf_s: Zipf exponent for book popularity and patron activity
+        replace: delete existing books and loans first (otherwise the tables must be empty)
+
+    Returns:
+        dict: row counts, the open fraction reached, the busiest patron and
+        the most borrowed book, and timing
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    as_of = as_of or date.today()
+    now = datetime.combine(as_of, datetime.min.time())
+
+    database.init_database()
+    conn = sqlite3.connect(database.DATABASE)
+    try:
+        if replace:
+            conn.execute("DELETE FROM borrow_records")
+            conn.execute("DELETE FROM books")
+            conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('books', 'borrow_records')")
+            conn.commit()
+        elif conn.execute("SELECT EXISTS (SELECT 1 FROM books)").fetchone()[0]:
+            raise ValueError("Target database already has books; use replace=True to overwrite.")
+
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("BEGIN IMMEDIATE")
+        recreate = _drop_secondary_objects(conn)
+
+        rand = rng.random
+        authors = [f"{_name(rand, 2)} {_name(rand, 3)}" for _ in range(max(1, books // 8))]
+        copies = [0]  # copies[book_id - first_id + 1]
+        for batch in _batches(_book_rows(rng, books, authors), BATCH_SIZE):
+            conn.executemany(
+                "INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            copies.extend(row[3] for row in batch)
+        first_id = conn.execute("SELECT MIN(id) FROM books").fetchone()[0] or 1
+
+        # Popular books and busy patrons get low ranks; shuffle so ids don't give it away.
+        book_ids = list(range(first_id, first_id + books))
+        rng.shuffle(book_ids)
+        patron_ids = [f"{n:06d}" for n in rng.sample(range(100000, 1000000), patrons)]
+        book_weights = _zipf_cum_weights(books, zipf_s)
+        patron_weights = _zipf_cum_weights(patrons, zipf_s)
+
+        on_loan: Dict[int, int] = {}
+        active: Dict[str, int] = {}
+        loans_per_patron: Dict[str, int] = {}
+        loans_per_book: Dict[int, int] = {}
+
+        def has_copy(book_id: int) -> bool:
+            return on_loan.get(book_id, 0) < copies[book_id - first_id + 1]
+
+        def can_borrow(patron_id: str) -> bool:
+            return active.get(patron_id, 0) < MAX_ACTIVE_LOANS
+
+        def loan_rows() -> Iterator[Tuple]:
+            remaining = loans
+            while remaining:
+                chunk = min(remaining, BATCH_SIZE)
+                remaining -= chunk
+                picked_books = rng.choices(book_ids, cum_weights=book_weights, k=chunk)
+                picked_patrons = rng.choices(patron_ids, cum_weights=patron_weights, k=chunk)
+                for book_id, patron_id in zip(picked_books, picked_patrons):
+                    is_open = rand() < open_fraction
+                    if is_open:
+                        # The Zipf head hits the copy and loan limits almost at
+                        # once; redraw from the whole catalog / patron list so
+                        # open loans still reach open_fraction.
+                        tries = 0
+                        while not (has_copy(book_id) and can_borrow(patron_id)) and tries < OPEN_LOAN_REDRAWS:
+                            if not has_copy(book_id):
+                                book_id = book_ids[int(rand() * books)]
+                            if not can_borrow(patron_id):
+                                patron_id = patron_ids[int(rand() * patrons)]
+                            tries += 1
+                        is_open = has_copy(book_id) and can_borrow(patron_id)
+                    seconds = int(rand() * 86400)
+                    if is_open:
+                        on_loan[book_id] = on_loan.get(book_id, 0) + 1
+                        active[patron_id] = active.get(patron_id, 0) + 1
+                        if rand() < overdue_fraction:
+                            age = LOAN_DAYS + 1 + int(rand() * 60)
+                        else:
+                            age = int(rand() * (LOAN_DAYS + 1))
+                        borrowed = now - timedelta(days=age, seconds=seconds)
+                        returned = None
+                    else:
+                        borrowed = now - timedelta(days=LOAN_DAYS + int(rand() * (history_days - LOAN_DAYS)), seconds=seconds)
+                        returned = (borrowed + timedelta(days=1 + int(rand() * (LOAN_DAYS + 14)))).isoformat()
+                    loans_per_patron[patron_id] = loans_per_patron.get(patron_id, 0) + 1
+                    loans_per_book[book_id] = loans_per_book.get(book_id, 0) + 1
+                    yield patron_id, book_id, borrowed.isoformat(), (borrowed + timedelta(days=LOAN_DAYS)).isoformat(), returned
+
+        for batch in _batches(loan_rows(), BATCH_SIZE):
+            conn.executemany(
+                "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+
+        conn.executemany(
+            "UPDATE books SET available_copies = total_copies - ? WHERE id = ?",
+            ((count, book_id) for book_id, count in on_loan.items()),
+        )
+        for sql in recreate:
+            conn.execute(sql)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone():
+            conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        conn.execute("UPDATE catalog_meta SET value = value + 1 WHERE key = 'catalog_version'")
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    database.close_pool()
+
+    elapsed = time.perf_counter() - started
+    open_loans = sum(on_loan.values())
+    return {
+        'books': books,
+        'patrons': patrons,
+        'loans': loans,
+        'open_loans': open_loans,
+        'open_fraction': open_loans / loans if loans else 0.0,
+        'busiest_patron': max(loans_per_patron, key=loans_per_patron.get) if loans_per_patron else None,
+        'most_borrowed_book': max(loans_per_book, key=loans_per_book.get) if loans_per_book else None,
+        'elapsed_seconds': elapsed,
+        'rows_per_second': (books + loans) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic library database.")
+    parser.add_argument('database', help="SQLite file to fill (created if missing)")
+    parser.add_argument('--books', type=int, default=100_000)
+    parser.add_argument('--patrons', type=int, default=10_000)
+    parser.add_argument('--loans', type=int, default=300_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', type=date.fromisoformat, help="date the history ends (default: today)")
+    parser.add_argument('--open-fraction', type=float, default=0.05, help="share of loans still out")
+    parser.add_argument('--overdue-fraction', type=float, default=0.3, help="share of open loans that are overdue")
+    parser.add_argument('--replace', action='store_true', help="delete existing books and loans first")
+    args = parser.parse_args(argv)
+
+    database.DATABASE = args.database
+    try:
+        report = generate_dataset(
+            books=args.books, patrons=args.patrons, loans=args.loans, seed=args.seed,
+            as_of=args.as_of, open_fraction=args.open_fraction,
+            overdue_fraction=args.overdue_fraction, replace=args.replace,
+        )
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    print(
+        f"Generated {report['books']} books and {report['loans']} loans "
+        f"({report['open_loans']} open, {report['open_fraction']:.1%}) for {report['patrons']} patrons "
+        f"in {report['elapsed_seconds']:.1f}s ({report['rows_per_second']:.0f} rows/s)."
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
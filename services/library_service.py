@@ -3,14 +3,66 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books
+    get_book_by_id, get_book_by_isbn,
+    insert_book, insert_books_bulk, borrow_book_atomic, return_book_atomic,
+    get_all_books, get_open_loans, get_patron_borrowed_books, get_patron_history,
+    search_books_fts, record_fee_payment_items, get_fees_paid_by_loan,
+    get_fee_payment_item, add_fee_item_refund, release_fee_item_refund,
+    record_payment_transaction, add_payment_transaction_refund, get_payment_transaction,
+    get_catalog_version, normalize_isbn, register_cache_invalidator,
+    SEARCH_RESULT_LIMIT
 )
-from services.payment_service import PaymentGateway
+import metrics
+from cache import LRUCache
+from services.payment_service import AsyncPaymentGateway, PaymentGateway
+
+BORROWS = metrics.Counter('library_borrows_total', 'Borrow attempts by outcome.', ('outcome',))
+RETURNS = metrics.Counter('library_returns_total', 'Return attempts by outcome.', ('outcome',))
+PAYMENTS = metrics.Counter('library_payments_total', 'Late fee payments sent to the gateway by outcome.', ('outcome',))
+REFUNDS = metrics.Counter('library_refunds_total', 'Late fee refunds sent to the gateway by outcome.', ('outcome',))
+
+# Settled transactions only change when refunded; refunds made through this
+# module update the cache at once, the TTL bounds staleness for others.
+PAYMENT_STATUS_CACHE_SIZE = 4096
+PAYMENT_STATUS_TTL = 300.0
+TERMINAL_PAYMENT_STATUSES = ('completed', 'refunded')
+
+_payment_status_cache = LRUCache(PAYMENT_STATUS_CACHE_SIZE, PAYMENT_STATUS_TTL)
+
+# Search results keyed by catalog version and normalized (type, term, limit).
+# Any write to books moves the version, so no TTL is needed; the old
+# entries are dropped as soon as the change is seen.
+SEARCH_CACHE_SIZE = 1024
+
+_search_cache = LRUCache(SEARCH_CACHE_SIZE)
+register_cache_invalidator(_search_cache.clear)
+
+def _validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """Apply the R1 field rules; return the first error message or None."""
+    if not title or not title.strip():
+        return "Title is required."
+    
+    if len(title.strip()) > 200:
+        return "Title must be less than 200 characters."
+    
+    if not author or not author.strip():
+        return "Author is required."
+    
+    if len(author.strip()) > 100:
+        return "Author must be less than 100 characters."
+    
+    if len(isbn) != 13:
+        return "ISBN must be exactly 13 digits."
+    
+    if not isinstance(total_copies, int) or total_copies <= 0:
+        return "Total copies must be a positive integer."
+
+    return None
 
 def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
     """
@@ -27,23 +79,9 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
         tuple: (success: bool, message: str)
     """
     # Input validation
-    if not title or not title.strip():
-        return False, "Title is required."
-    
-    if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
-    
-    if not author or not author.strip():
-        return False, "Author is required."
-    
-    if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
-    
-    if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
-    
-    if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+    error = _validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -57,6 +95,85 @@ def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -
     else:
         return False, "Database error occurred while adding the book."
 
+def bulk_add_books(books: Iterable[Dict], batch_size: int = 1000) -> Dict:
+    """
+    Add many books to the catalog at once.
+    Applies the R1 rules of add_book_to_catalog to every row.
+
+    Valid rows are inserted in batches of `batch_size`, one transaction and
+    one duplicate-ISBN query per batch. Rows that fail validation, repeat an
+    ISBN earlier in the input, or already exist in the catalog are reported
+    and skipped; the rest of the import carries on.
+
+    Args:
+        books: dicts with 'title', 'author', 'isbn' and 'total_copies'
+        batch_size: rows per insert transaction
+
+    Returns:
+        dict: counts, per-row errors (0-based 'row' index) and throughput
+    """
+    started = time.perf_counter()
+    errors: List[Dict] = []
+    seen_isbns = set()
+    batch: List[Tuple[int, Tuple[str, str, str, int, int]]] = []
+    inserted = 0
+    total = 0
+
+    def flush() -> int:
+        rows = [book for _, book in batch]
+        skipped = insert_books_bulk(rows)
+        if skipped is None:
+            for row_num, book in batch:
+                errors.append({'row': row_num, 'isbn': book[2],
+                               'error': "Database error occurred while adding the book."})
+            return 0
+        skipped = set(skipped)
+        for row_num, book in batch:
+            if book[2] in skipped:
+                errors.append({'row': row_num, 'isbn': book[2],
+                               'error': "A book with this ISBN already exists."})
+        return len(rows) - len(skipped)
+
+    for row_num, book in enumerate(books):
+        total += 1
+        title = book.get('title') or ''
+        author = book.get('author') or ''
+        isbn = book.get('isbn') or ''
+        total_copies = book.get('total_copies')
+
+        # JSON rows may carry numbers where text is expected; reject the row, not the import.
+        mistyped = next((name for name, value in (('Title', title), ('Author', author), ('ISBN', isbn))
+                         if not isinstance(value, str)), None)
+        if mistyped:
+            error = f"{mistyped} must be text."
+        else:
+            error = _validate_book_fields(title, author, isbn, total_copies)
+        if not error and isbn in seen_isbns:
+            error = "Duplicate ISBN earlier in this import."
+        if error:
+            errors.append({'row': row_num, 'isbn': isbn, 'error': error})
+            continue
+
+        seen_isbns.add(isbn)
+        batch.append((row_num, (title.strip(), author.strip(), isbn, total_copies, total_copies)))
+        if len(batch) >= batch_size:
+            inserted += flush()
+            batch.clear()
+
+    if batch:
+        inserted += flush()
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda e: e['row'])
+    return {
+        'total': total,
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(total / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
 def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     """
     Allow a patron to borrow a book.
@@ -73,108 +190,200 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    # Availability check, limit check, decrement and borrow record in one transaction
+    result = borrow_book_atomic(patron_id, book_id, borrow_date, due_date, max_active_loans=5)
+    status = result['status']
+    BORROWS.inc(outcome=status)
+    
+    if status == 'not_found':
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    if status == 'unavailable':
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
+    if status == 'limit':
         return False, "You have reached the maximum borrowing limit of 5 books."
     
-    # Create borrow record
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
-    
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    if status != 'ok':
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-    
-    return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
+    return True, f'Successfully borrowed "{result["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
 
 def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
         return False, "Invalid patron ID (must be 6 digits)."
 
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-
+    # Close the loan, restock the copy and read the due date in one transaction
     now = datetime.now()
-    updated = update_borrow_record_return_date(patron_id, book_id, now)
-    if not updated:
+    result = return_book_atomic(patron_id, book_id, now)
+    RETURNS.inc(outcome=result['status'])
+    if result['status'] == 'not_found':
+        return False, "Book not found."
+    if result['status'] == 'no_loan':
         return False, "No active borrow record for this patron and book."
+    if result['status'] != 'ok':
+        return False, "Database error occurred while recording the return."
 
-    # Update availability
-    if not update_book_availability(book_id, +1):
-        return False, "Could not update book availability."
-
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
-    try:
-        fee_amt = float(fee_info.get("fee_amount", 0.0))
-    except Exception:
-        fee_amt = 0.0
+    # Less anything already paid for the loan(s) just closed
+    priced = calculate_late_fees_batch(result['loans'], now)
+    fee_amt = round(sum(owed for _, owed in _unpaid_late_fees(patron_id, priced, 'id')), 2)
 
     fee_txt = f" Late fee: ${fee_amt:.2f}." if fee_amt > 0 else " No late fee."
-    return True, f'Returned "{book.get("title", "")}" on {now.strftime("%Y-%m-%d")}.{fee_txt}'
+    return True, f'Returned "{result["title"]}" on {now.strftime("%Y-%m-%d")}.{fee_txt}'
+
+
+def _late_fee(due_date: datetime, as_of: datetime) -> Tuple[int, float]:
+    """
+    R5 fee for a loan due on `due_date`, as of `as_of`.
+    $0.50/day for the first 7 days overdue, $1.00/day after that, capped at $15.00.
+
+    Returns:
+        tuple: (days_overdue: int, fee_amount: float)
+    """
+    days_overdue = max(0, (as_of - due_date).days)
+    fee = 0.50 * min(days_overdue, 7) + 1.00 * max(days_overdue - 7, 0)
+    return days_overdue, round(min(fee, 15.00), 2)
+
+
+def calculate_late_fees_batch(loans: Iterable[Dict], as_of: Optional[datetime] = None) -> List[Dict]:
+    """
+    Price many loans at once with the R5 rules.
+    Implements R5: Late Fee Calculation for billing runs
+
+    Args:
+        loans: borrow record dicts with a 'due_date' datetime (as returned by get_open_loans)
+        as_of: moment to price at (defaults to now)
+
+    Returns:
+        list: each loan dict extended with 'days_overdue' and 'fee_amount'
+    """
+    as_of = as_of or datetime.now()
+    priced = []
+    for loan in loans:
+        days_overdue, fee_amount = _late_fee(loan['due_date'], as_of)
+        priced.append({**loan, 'days_overdue': days_overdue, 'fee_amount': fee_amount})
+    return priced
+
 
+def calculate_overdue_fees(as_of: Optional[datetime] = None) -> List[Dict]:
+    """Price every overdue loan in the system (nightly billing)."""
+    as_of = as_of or datetime.now()
+    return calculate_late_fees_batch(get_open_loans(due_before=as_of), as_of)
+
+
+def _unpaid_late_fees(patron_id: str, priced: List[Dict], record_key: str) -> List[Tuple[Dict, float]]:
+    """
+    Subtract what was already paid for each priced loan (loan id under
+    `record_key`); return (loan, amount still owed) for loans that owe anything.
+    """
+    # On-time loans owe nothing either way; skip the payments query for them
+    paid = get_fees_paid_by_loan(patron_id) if any(loan['fee_amount'] > 0 for loan in priced) else {}
+    unpaid = []
+    for loan in priced:
+        owed = round(loan['fee_amount'] - paid.get(loan[record_key], 0.0), 2)
+        if owed > 0:
+            unpaid.append((loan, owed))
+    return unpaid
 
 
 def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
+    """
+    Late fee currently owed for one patron's loan of one book,
+    less anything already paid for that loan.
+    Implements R5: Late Fee Calculation API
+    """
     if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
         return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'Invalid patron ID'}
-    if not get_book_by_id(book_id):
-        return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'Book not found'}
 
-    return {
-        'fee_amount': 0.00,
-        'days_overdue': 0,
-        'status': 'Late fee calculation unavailable (missing accessor)'
+    fee_info, _ = _late_fee_owed_for_book(patron_id, book_id)
+    return fee_info
+
+
+def _late_fee_owed_for_book(patron_id: str, book_id: int) -> Tuple[Dict, List[Tuple[int, int, float]]]:
+    """
+    R5 fee info for one book plus the (borrow_record_id, book_id, amount)
+    items it is made of, so a payment charges exactly what it records.
+    """
+    loans = get_open_loans(patron_id=patron_id, book_id=book_id)
+    if not loans:
+        if not get_book_by_id(book_id):
+            return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'Book not found'}, []
+        return {'fee_amount': 0.00, 'days_overdue': 0, 'status': 'No active loan for this book'}, []
+
+    priced = calculate_late_fees_batch(loans)
+    items = [(loan['id'], book_id, owed) for loan, owed in _unpaid_late_fees(patron_id, priced, 'id')]
+    fee_info = {
+        'fee_amount': round(sum(owed for _, _, owed in items), 2),
+        'days_overdue': max(loan['days_overdue'] for loan in priced),
+        'status': 'OK'
     }
+    return fee_info, items
 
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str,
+                            limit: int = SEARCH_RESULT_LIMIT) -> List[Dict]:
     q = (search_term or "").strip()
     st = (search_type or "").strip().lower()
     if not q or st not in {"title", "author", "isbn"}:
         return []
 
+    # Matching ignores case (and ISBN punctuation), so equivalent terms share an entry.
+    term = normalize_isbn(q) if st == "isbn" else q.lower()
+    key = (get_catalog_version(), st, term, limit)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return [dict(book) for book in cached]
+
+    books = _search_catalog(q, st, limit)
+    _search_cache.set(key, [dict(book) for book in books])
+    return books
+
+
+def _search_catalog(q: str, st: str, limit: int) -> List[Dict]:
     if st == "isbn":
-        normalized = q.replace("-", "").replace(" ", "")
-        book = get_book_by_isbn(normalized)
-        if book:
-            return [book]
-
-        books = get_all_books() or []
-        return [
-            b for b in books
-            if (b.get("isbn") or "").replace("-", "").replace(" ", "") == normalized
-        ]
-
-    books = get_all_books() or []
+        # Hyphens and spaces are ignored through the indexed isbn_normalized column
+        book = get_book_by_isbn(q)
+        return [book] if book else []
+
     key = st  # 'title' or 'author'
+    books = search_books_fts(q, key, limit)
+    if books is not None:
+        return books
+
+    # Terms too short for the trigram index (or no FTS5): scan the catalog.
     ql = q.lower()
-    return [b for b in books if ql in (b.get(key) or "").lower()]
+    matches = [b for b in get_all_books() or [] if ql in (b.get(key) or "").lower()]
+    return matches[:limit]
+
+
+def get_patron_status_report(patron_id: str, history_limit: int = 20) -> Dict:
+    """
+    Build a patron's status: current loans with due dates and fees,
+    total fees owed, and borrowing history.
+    Implements R7: Patron Status Report
 
+    Uses two queries (open loans; recent history with total count) and the
+    batch fee engine, however many loans the patron has.
 
-def get_patron_status_report(patron_id: str) -> Dict:
+    Args:
+        patron_id: 6-digit library card ID
+        history_limit: most recent history records to include
+
+    Returns:
+        dict: report with 'current_loans', 'history' (newest first, capped at
+        history_limit) and 'history_count' (all records)
+    """
     report: Dict = {
         'patron_id': patron_id,
         'borrowed_count': 0,
         'total_late_fees': 0.00,
         'current_loans': [],
         'history': [],
+        'history_count': 0,
         'notes': 'OK'
     }
 
@@ -183,14 +392,67 @@ def get_patron_status_report(patron_id: str) -> Dict:
         return report
 
     try:
-        report['borrowed_count'] = int(get_patron_borrow_count(patron_id) or 0)
+        current = get_patron_borrowed_books(patron_id)
+        history, history_count = get_patron_history(patron_id, history_limit)
+        loans = calculate_late_fees_batch(current)
+        owed = {loan['borrow_record_id']: amount
+                for loan, amount in _unpaid_late_fees(patron_id, loans, 'borrow_record_id')}
     except Exception:
-        report['notes'] = 'Unable to fetch borrow count'
+        report['notes'] = 'Unable to fetch patron loans'
         return report
 
-    report['notes'] = 'Loan/fee details unavailable with current DB helpers'
+    # Fees are what is still owed, as for calculate_late_fee_for_book and pay_all_late_fees
+    for loan in loans:
+        loan['fee_amount'] = owed.get(loan['borrow_record_id'], 0.00)
+    report['current_loans'] = loans
+    report['borrowed_count'] = len(loans)
+    report['total_late_fees'] = round(sum(owed.values()), 2)
+    report['history'] = history
+    report['history_count'] = history_count
     return report
 
+def _prepare_late_fee_payment(patron_id: str, book_id: int) -> Tuple[Optional[str], float, Optional[Dict], List]:
+    """
+    Validate a late fee payment before it reaches the gateway.
+    
+    Returns:
+        tuple: (error message or None, fee amount, book record,
+        (borrow_record_id, book_id, amount) items to record once charged)
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits.", 0.0, None, []
+    
+    # Fee and the loans it pays for in one pass (net of earlier payments),
+    # so the amount charged is exactly the sum of the items recorded
+    try:
+        fee_info, items = _late_fee_owed_for_book(patron_id, book_id)
+    except Exception:
+        return "Unable to calculate late fees.", 0.0, None, []
+    
+    # Check if there's a fee to pay
+    if not fee_info or 'fee_amount' not in fee_info:
+        return "Unable to calculate late fees.", 0.0, None, []
+    
+    fee_amount = fee_info.get('fee_amount', 0.0)
+    
+    if fee_amount <= 0:
+        return "No late fees to pay for this book.", 0.0, None, []
+    
+    # Get book details for payment description
+    book = get_book_by_id(book_id)
+    if not book:
+        return "Book not found.", 0.0, None, []
+    
+    return None, fee_amount, book, items
+
+
+def _record_single_fee_payment(transaction_id: str, patron_id: str, fee_amount: float, items: List) -> None:
+    """Write a completed single-book charge to the ledger with the loans it paid for."""
+    _record_transaction(transaction_id, 'completed', patron_id, fee_amount)
+    if items:
+        record_fee_payment_items(transaction_id, patron_id, items, datetime.now())
+
 def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
@@ -212,26 +474,9 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
-    # Validate patron ID
-    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
-        return False, "Invalid patron ID. Must be exactly 6 digits.", None
-    
-    # Calculate late fee first
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
-    
-    # Check if there's a fee to pay
-    if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
-    
-    fee_amount = fee_info.get('fee_amount', 0.0)
-    
-    if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
-    
-    # Get book details for payment description
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found.", None
+    error, fee_amount, book, items = _prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -246,17 +491,171 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
             description=f"Late fees for '{book['title']}'"
         )
         
+        PAYMENTS.inc(outcome='completed' if success else 'declined')
         if success:
+            _record_single_fee_payment(transaction_id, patron_id, fee_amount, items)
             return True, f"Payment successful! {message}", transaction_id
         else:
             return False, f"Payment failed: {message}", None
             
     except Exception as e:
         # Handle payment gateway errors
+        PAYMENTS.inc(outcome='error')
+        return False, f"Payment processing error: {str(e)}", None
+
+
+def pay_all_late_fees(patron_id: str, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Pay every outstanding late fee of a patron with one gateway charge.
+    
+    Fees for all of the patron's open loans are priced in one batch, minus
+    anything already paid for the same loan, and submitted as a single
+    itemized charge. Each loan's share is recorded against the transaction
+    so refund_late_fee_payment(..., book_id=...) can refund books individually.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        payment_gateway: Payment gateway instance (injectable for testing)
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+    
+    try:
+        loans = calculate_late_fees_batch(get_patron_borrowed_books(patron_id))
+        items = _unpaid_late_fees(patron_id, loans, 'borrow_record_id')
+    except Exception:
+        return False, "Unable to calculate late fees.", None
+    
+    if not items:
+        return False, "No late fees to pay.", None
+    
+    total = round(sum(owed for _, owed in items), 2)
+    description = "Late fees: " + "; ".join(f"'{loan['title']}' ${owed:.2f}" for loan, owed in items)
+    
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=total,
+            description=description
+        )
+    except Exception as e:
+        PAYMENTS.inc(outcome='error')
         return False, f"Payment processing error: {str(e)}", None
+    
+    PAYMENTS.inc(outcome='completed' if success else 'declined')
+    if not success:
+        return False, f"Payment failed: {message}", None
+    
+    _record_transaction(transaction_id, 'completed', patron_id, total)
+    recorded = record_fee_payment_items(
+        transaction_id, patron_id,
+        [(loan['borrow_record_id'], loan['book_id'], owed) for loan, owed in items],
+        datetime.now()
+    )
+    if not recorded:
+        return True, f"Payment successful! {message} (itemization could not be saved)", transaction_id
+    return True, f"Payment successful! {message} Paid fees for {len(items)} book(s).", transaction_id
+
+def _record_transaction(transaction_id: str, status: str,
+                        patron_id: Optional[str] = None, amount: Optional[float] = None) -> None:
+    """Write a gateway transaction to the ledger and drop its cached status."""
+    record_payment_transaction(transaction_id, status, patron_id, amount)
+    _payment_status_cache.invalidate(transaction_id)
+
+def _record_refund(transaction_id: str, amount: float) -> None:
+    """Add a refund to the ledger ('refunded' only once fully refunded) and drop the cached status."""
+    add_payment_transaction_refund(transaction_id, amount)
+    _payment_status_cache.invalidate(transaction_id)
+
+def get_payment_status(transaction_id: str, payment_gateway: PaymentGateway = None) -> Dict:
+    """
+    Status of a payment transaction, asking the gateway only when needed.
+    
+    Completed and refunded transactions are answered from an in-memory TTL
+    cache or the payment_transactions ledger; pending or unknown ones are
+    checked with the gateway, and a settled answer is saved to the ledger.
+    
+    Returns:
+        dict: transaction_id, status and amount (gateway format)
+    """
+    status = _payment_status_cache.get(transaction_id)
+    if status is not None:
+        return dict(status)
+    
+    txn = get_payment_transaction(transaction_id)
+    if txn and txn['status'] in TERMINAL_PAYMENT_STATUSES:
+        status = {'transaction_id': transaction_id, 'status': txn['status'], 'amount': txn['amount']}
+        _payment_status_cache.set(transaction_id, status)
+        return dict(status)
+    
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    try:
+        status = payment_gateway.verify_payment_status(transaction_id)
+    except Exception as e:
+        return {'transaction_id': transaction_id, 'status': 'error', 'message': f"Status check error: {str(e)}"}
+    
+    if status.get('status') in TERMINAL_PAYMENT_STATUSES:
+        record_payment_transaction(transaction_id, status['status'], amount=status.get('amount'))
+        _payment_status_cache.set(transaction_id, dict(status))
+    return status
 
+def get_search_cache_stats() -> Dict:
+    """Hit/miss/eviction counters for the search result cache."""
+    return _search_cache.stats()
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+
+def clear_search_cache() -> None:
+    """Drop every cached search result."""
+    _search_cache.clear()
+
+
+def get_payment_status_cache_stats() -> Dict:
+    """Hit/miss counters for the payment status cache."""
+    return _payment_status_cache.stats()
+
+def _validate_refund(transaction_id: str, amount: float) -> Optional[str]:
+    """Return the reason a refund request is invalid, or None."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    
+    if amount > 15.00:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    
+    return None
+
+def _reserve_item_refund(transaction_id: str, book_id: int, amount: float) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Check a refund of one book's share of an itemized charge and hold the
+    amount against that line before the gateway is called, so concurrent
+    refunds cannot both pass the balance check; return (error, item).
+    """
+    item = get_fee_payment_item(transaction_id, book_id)
+    if not item:
+        return "No late fee for this book was paid in that transaction.", None
+    
+    if amount > round(item['amount'] - item['refunded_amount'], 2) or not add_fee_item_refund(item['id'], amount):
+        return "Refund amount exceeds the fee paid for this book.", None
+    
+    return None, item
+
+def _release_item_refund(item: Optional[Dict], amount: float) -> None:
+    """Give back a reserved item refund the gateway did not carry out."""
+    if item is not None:
+        release_fee_item_refund(item['id'], amount)
+
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None,
+                            book_id: Optional[int] = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -266,19 +665,22 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         transaction_id: Original transaction ID to refund
         amount: Amount to refund
         payment_gateway: Payment gateway instance (injectable for testing)
+        book_id: For charges made by pay_all_late_fees, the book whose share
+            is being refunded (limits the refund to what was paid for it)
         
     Returns:
         tuple: (success: bool, message: str)
     """
     # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
-    
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error
     
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    item = None
+    if book_id is not None:
+        error, item = _reserve_item_refund(transaction_id, book_id, amount)
+        if error:
+            return False, error
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -289,10 +691,93 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     try:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
         
+        REFUNDS.inc(outcome='completed' if success else 'declined')
+        if success:
+            _record_refund(transaction_id, amount)
+            return True, message
+        else:
+            _release_item_refund(item, amount)
+            return False, f"Refund failed: {message}"
+            
+    except Exception as e:
+        REFUNDS.inc(outcome='error')
+        _release_item_refund(item, amount)
+        return False, f"Refund processing error: {str(e)}"
+
+
+async def pay_late_fees_async(patron_id: str, book_id: int,
+                              payment_gateway: AsyncPaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Awaitable version of pay_late_fees for async routes and workers.
+    
+    Validation, fee lookup and ledger writes are the same as pay_late_fees
+    but run in a worker thread (they are blocking SQLite calls and may wait
+    for a pooled connection), so the event loop is never blocked.
+    
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
+    error, fee_amount, book, items = await asyncio.to_thread(_prepare_late_fee_payment, patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, transaction_id, message = await payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=f"Late fees for '{book['title']}'"
+        )
+        
+        PAYMENTS.inc(outcome='completed' if success else 'declined')
+        if success:
+            await asyncio.to_thread(_record_single_fee_payment, transaction_id, patron_id, fee_amount, items)
+            return True, f"Payment successful! {message}", transaction_id
+        else:
+            return False, f"Payment failed: {message}", None
+            
+    except Exception as e:
+        PAYMENTS.inc(outcome='error')
+        return False, f"Payment processing error: {str(e)}", None
+
+
+async def refund_late_fee_payment_async(transaction_id: str, amount: float,
+                                        payment_gateway: AsyncPaymentGateway = None,
+                                        book_id: Optional[int] = None) -> Tuple[bool, str]:
+    """
+    Awaitable version of refund_late_fee_payment; its database work runs
+    in a worker thread, as for pay_late_fees_async.
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error
+    
+    item = None
+    if book_id is not None:
+        error, item = await asyncio.to_thread(_reserve_item_refund, transaction_id, book_id, amount)
+        if error:
+            return False, error
+    
+    if payment_gateway is None:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, message = await payment_gateway.refund_payment(transaction_id, amount)
+        
+        REFUNDS.inc(outcome='completed' if success else 'declined')
         if success:
+            await asyncio.to_thread(_record_refund, transaction_id, amount)
             return True, message
         else:
+            await asyncio.to_thread(_release_item_refund, item, amount)
             return False, f"Refund failed: {message}"
             
     except Exception as e:
-        return False, f"Refund processing error: {str(e)}"
\ No newline at end of file
+        REFUNDS.inc(outcome='error')
+        await asyncio.to_thread(_release_item_refund, item, amount)
+        return False, f"Refund processing error: {str(e)}"
@@ -0,0 +1,250 @@
+"""
+Payment Jobs - Background processing of late fee payments and refunds
+
+Routes enqueue a job in the payment_jobs table and return at once; a pool
+of worker threads claims queued jobs, talks to the payment gateway and
+stores the outcome, which clients poll via GET /api/payments/<job_id>.
+
+Workers can also run in their own process:
+    python -m services.payment_jobs [--workers 2] [--database library.db]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import database
+from database import (
+    claim_payment_job, enqueue_payment_job, fail_stale_payment_jobs,
+    finish_payment_job, get_active_payment_job, get_payment_job
+)
+from services.library_service import (
+    _validate_refund, pay_all_late_fees, pay_late_fees, refund_late_fee_payment
+)
+from services.payment_service import PaymentGateway
+
+# Jobs still 'running' this long after they started belong to a dead worker.
+STALE_JOB_AFTER = timedelta(minutes=5)
+
+
+def submit_payment(patron_id: str, book_id: int) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue a late fee payment for one book.
+
+    While a payment for the same patron and book, or a pay-all for the
+    patron, is queued or running, the submission is refused with that job's id.
+
+    Returns:
+        tuple: (success: bool, message: str, job_id: Optional[int])
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+
+    dedupe_key = f"payment:{patron_id}:{book_id}"
+    job_id = enqueue_payment_job('payment', {'patron_id': patron_id, 'book_id': book_id}, dedupe_key)
+    if job_id is None:
+        active = get_active_payment_job(dedupe_key)
+        if active is not None:
+            return False, "A payment for this book is already in progress.", active
+        return False, "Database error occurred while queuing the payment.", None
+    _notify_workers()
+    return True, "Payment queued.", job_id
+
+
+def submit_pay_all(patron_id: str) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue one itemized payment of all of a patron's late fees.
+
+    The patron-wide key also refuses it while any single-book payment of
+    the patron is queued or running (and the other way round), so the same
+    loan is never charged by two jobs at once.
+
+    Returns:
+        tuple: (success: bool, message: str, job_id: Optional[int])
+    """
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return False, "Invalid patron ID. Must be exactly 6 digits.", None
+
+    dedupe_key = f"payment:{patron_id}"
+    job_id = enqueue_payment_job('payment', {'patron_id': patron_id}, dedupe_key)
+    if job_id is None:
+        active = get_active_payment_job(dedupe_key)
+        if active is not None:
+            return False, "A late fee payment for this patron is already in progress.", active
+        return False, "Database error occurred while queuing the payment.", None
+    _notify_workers()
+    return True, "Payment queued.", job_id
+
+
+def submit_refund(transaction_id: str, amount: float, book_id: Optional[int] = None) -> Tuple[bool, str, Optional[int]]:
+    """
+    Queue a refund of a late fee payment.
+
+    While a refund of the same transaction (and book) is queued or running,
+    a retried or repeated submission is refused with that job's id.
+
+    Returns:
+        tuple: (success: bool, message: str, job_id: Optional[int])
+    """
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error, None
+
+    dedupe_key = f"refund:{transaction_id}" if book_id is None else f"refund:{transaction_id}:{book_id}"
+    job_id = enqueue_payment_job(
+        'refund', {'transaction_id': transaction_id, 'amount': amount, 'book_id': book_id}, dedupe_key
+    )
+    if job_id is None:
+        active = get_active_payment_job(dedupe_key)
+        if active is not None:
+            return False, "A refund of this payment is already in progress.", active
+        return False, "Database error occurred while queuing the refund.", None
+    _notify_workers()
+    return True, "Refund queued.", job_id
+
+
+def get_job_status(job_id: int) -> Optional[Dict]:
+    """Public view of a job for status polling (None if there is no such job)."""
+    job = get_payment_job(job_id)
+    if not job:
+        return None
+
+    result = job['result'] or {}
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'message': result.get('message'),
+        'transaction_id': result.get('transaction_id'),
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+def run_job(job: Dict, payment_gateway: PaymentGateway = None) -> Tuple[bool, Dict]:
+    """Carry out one claimed job; return (succeeded, result to store)."""
+    payload = job['payload']
+    try:
+        if job['kind'] == 'payment':
+            if payload.get('book_id') is None:
+                success, message, transaction_id = pay_all_late_fees(payload['patron_id'], payment_gateway)
+            else:
+                success, message, transaction_id = pay_late_fees(
+                    payload['patron_id'], payload['book_id'], payment_gateway
+                )
+            return success, {'success': success, 'message': message, 'transaction_id': transaction_id}
+
+        success, message = refund_late_fee_payment(
+            payload['transaction_id'], payload['amount'], payment_gateway, book_id=payload.get('book_id')
+        )
+        return success, {'success': success, 'message': message, 'transaction_id': payload['transaction_id']}
+    except Exception as e:
+        return False, {'success': False, 'message': f"Payment processing error: {str(e)}"}
+
+
+class PaymentWorkerPool:
+    """
+    Threads that claim and run queued payment jobs.
+
+    Idle workers poll the table every `poll_interval` seconds; jobs queued
+    from this process wake them immediately.
+    """
+
+    def __init__(self, workers: int = 2, poll_interval: float = 0.5,
+                 gateway_factory: Optional[Callable[[], PaymentGateway]] = None):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.gateway_factory = gateway_factory
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self.processed = 0
+
+    def start(self) -> None:
+        fail_stale_payment_jobs(datetime.now() - STALE_JOB_AFTER)
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"payment-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self) -> None:
+        with self._wake:
+            self._wake.notify()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Let running jobs finish, then stop every worker."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stopping:
+            job = claim_payment_job()
+            if job is None:
+                with self._wake:
+                    if not self._stopping:
+                        self._wake.wait(self.poll_interval)
+                continue
+
+            gateway = self.gateway_factory() if self.gateway_factory else None
+            succeeded, result = run_job(job, gateway)
+            finish_payment_job(job['id'], succeeded, result)
+            self.processed += 1
+
+
+_WORKERS: Optional[PaymentWorkerPool] = None
+_WORKERS_LOCK = threading.Lock()
+
+
+def start_payment_workers(workers: int = 2, poll_interval: float = 0.5,
+                          gateway_factory: Optional[Callable[[], PaymentGateway]] = None) -> Optional[PaymentWorkerPool]:
+    """Start this process's worker pool once; later calls return the running pool."""
+    global _WORKERS
+    with _WORKERS_LOCK:
+        if _WORKERS is None and workers > 0:
+            _WORKERS = PaymentWorkerPool(workers, poll_interval, gateway_factory)
+            _WORKERS.start()
+        return _WORKERS
+
+
+def stop_payment_workers() -> None:
+    global _WORKERS
+    with _WORKERS_LOCK:
+        if _WORKERS is not None:
+            _WORKERS.stop()
+            _WORKERS = None
+
+
+def _notify_workers() -> None:
+    if _WORKERS is not None:
+        _WORKERS.notify()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Process queued late fee payments and refunds.")
+    parser.add_argument('--workers', type=int, default=2, help="worker threads")
+    parser.add_argument('--gateway-url', help="payment gateway API root (default: simulated gateway)")
+    parser.add_argument('--database', help="SQLite file holding the queue (default: %s)" % database.DATABASE)
+    args = parser.parse_args(argv)
+
+    if args.database:
+        database.DATABASE = args.database
+    factory = (lambda: PaymentGateway(base_url=args.gateway_url)) if args.gateway_url else None
+
+    start_payment_workers(args.workers, gateway_factory=factory)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_payment_workers()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,31 +6,332 @@ For Assignment 3: You will learn to mock this service in their tests
 since we cannot make actual payment API calls during testing.
 """
 
+import asyncio
+import random
+import threading
+import uuid
 import requests
-from typing import Dict, Tuple
+from collections import deque
+import instrumentation
+import metrics
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
 import time
 
 
+def _simulate_payment(patron_id: str, amount: float) -> Tuple[bool, str, str]:
+    """Simulated gateway decision for a charge (shared by the sync and async clients)."""
+    if amount <= 0:
+        return False, "", "Invalid amount: must be greater than 0"
+    
+    if amount > 1000:
+        return False, "", "Payment declined: amount exceeds limit"
+    
+    if len(patron_id) != 6:
+        return False, "", "Invalid patron ID format"
+    
+    # Simulate successful payment
+    transaction_id = f"txn_{patron_id}_{int(time.time())}"
+    return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+
+
+def _simulate_refund(transaction_id: str, amount: float) -> Tuple[bool, str]:
+    """Simulated gateway decision for a refund."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return False, "Invalid transaction ID"
+    
+    if amount <= 0:
+        return False, "Invalid refund amount"
+    
+    refund_id = f"refund_{transaction_id}_{int(time.time())}"
+    return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+
+
+def _simulate_status(transaction_id: str) -> Dict:
+    """Simulated gateway answer to a status check."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return {"status": "not_found", "message": "Transaction not found"}
+    
+    return {
+        "transaction_id": transaction_id,
+        "status": "completed",
+        "amount": 10.50,
+        "timestamp": time.time()
+    }
+
+
+class GatewayUnavailableError(Exception):
+    """Raised internally when a gateway call cannot get an answer (network error, 5xx, open circuit)."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the gateway is degraded.
+    
+    After `failure_threshold` consecutive failed attempts the circuit opens
+    and calls are refused without touching the network. Once `reset_timeout`
+    seconds have passed a single trial call is let through (half-open); its
+    success closes the circuit again, its failure re-opens it.
+    """
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+    
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    def allow(self) -> bool:
+        """Return True if a call may go out now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class GatewayMetrics:
+    """Thread-safe call counters and latency samples per gateway operation."""
+    
+    def __init__(self, max_samples: int = 1000):
+        self._max_samples = max_samples
+        self._ops = {}
+        self._lock = threading.Lock()
+    
+    def _op(self, operation: str) -> Dict:
+        op = self._ops.get(operation)
+        if op is None:
+            op = self._ops[operation] = {
+                "calls": 0, "errors": 0, "retries": 0, "rejected": 0,
+                "latencies": deque(maxlen=self._max_samples),
+            }
+        return op
+    
+    def record_call(self, operation: str, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            op = self._op(operation)
+            op["calls"] += 1
+            if not ok:
+                op["errors"] += 1
+            op["latencies"].append(elapsed)
+    
+    def record_retry(self, operation: str) -> None:
+        with self._lock:
+            self._op(operation)["retries"] += 1
+    
+    def record_rejected(self, operation: str) -> None:
+        with self._lock:
+            self._op(operation)["rejected"] += 1
+    
+    def snapshot(self) -> Dict[str, Dict]:
+        """Counters plus p50/p95/p99 latency in milliseconds for each operation."""
+        with self._lock:
+            ops = {name: dict(op, latencies=sorted(op["latencies"])) for name, op in self._ops.items()}
+        
+        result = {}
+        for name, op in ops.items():
+            samples = op.pop("latencies")
+            for label, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+                op[label] = round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3) if samples else None
+            op["samples"] = len(samples)
+            result[name] = op
+        return result
+    
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+
+GATEWAY_LATENCY = metrics.Histogram(
+    'library_gateway_request_duration_seconds',
+    'Payment gateway HTTP request latency by operation and outcome.',
+    ('operation', 'outcome'),
+)
+
+
+# PaymentGateway objects are cheap and created per call by the service layer,
+# so the connection pool and circuit breaker live here, one per gateway URL.
+_SESSIONS: Dict[str, requests.Session] = {}
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_SHARED_LOCK = threading.Lock()
+METRICS = GatewayMetrics()
+
+
+def _shared_session(base_url: str, pool_size: int) -> requests.Session:
+    """Return the keep-alive session for a gateway URL, creating it on first use."""
+    with _SHARED_LOCK:
+        session = _SESSIONS.get(base_url)
+        if session is None:
+            session = requests.Session()
+            # Retries are done by PaymentGateway (with idempotency keys), not urllib3.
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[base_url] = session
+        return session
+
+
+def _shared_breaker(base_url: str, failure_threshold: int, reset_timeout: float) -> CircuitBreaker:
+    with _SHARED_LOCK:
+        breaker = _BREAKERS.get(base_url)
+        if breaker is None:
+            breaker = _BREAKERS[base_url] = CircuitBreaker(failure_threshold, reset_timeout)
+        return breaker
+
+
+def get_gateway_metrics() -> Dict:
+    """Latency/error metrics of every PaymentGateway HTTP call plus each circuit's state."""
+    with _SHARED_LOCK:
+        circuits = {url: breaker.state for url, breaker in _BREAKERS.items()}
+    return {"operations": METRICS.snapshot(), "circuits": circuits}
+
+
+def reset_gateway_state() -> None:
+    """Close pooled sessions and forget breakers and metrics (tests, config reloads)."""
+    with _SHARED_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+        _BREAKERS.clear()
+    METRICS.reset()
+
+
 class PaymentGateway:
     """
     Simulates an external payment gateway API.
     In production, this would connect to services like Stripe, PayPal, etc.
     
+    With `base_url` set, calls go over HTTP to the gateway API
+    (POST /charges, POST /refunds, GET /charges/<id>) through a pooled
+    keep-alive session shared by every instance pointing at that URL. Each
+    attempt has connect/read timeouts; network errors, 429 and 5xx answers
+    are retried with jittered exponential backoff, and POSTs carry one
+    Idempotency-Key across retries so a charge is never made twice. A
+    circuit breaker per URL refuses calls while the gateway keeps failing.
+    Without `base_url` the simulated gateway decisions are used.
+    
     For testing purposes, you should MOCK this class to avoid:
     - Making actual API calls
     - Depending on external service availability
     - Incurring costs or rate limits
     """
     
-    def __init__(self, api_key: str = "test_key_12345"):
+    def __init__(self, api_key: str = "test_key_12345", base_url: Optional[str] = None,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 max_retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 2.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0, pool_size: int = 10):
         """
         Initialize payment gateway with API credentials.
         
         Args:
             api_key: API key for authentication (default is test key)
+            base_url: gateway API root, e.g. "http://127.0.0.1:8081" (None = simulated)
+            connect_timeout: seconds allowed to open a connection, per attempt
+            read_timeout: seconds allowed to wait for a response, per attempt
+            max_retries: extra attempts after a retryable failure
+            backoff_base: first retry waits up to this many seconds (full jitter, doubling)
+            backoff_max: cap on a single backoff wait
+            failure_threshold: consecutive failed attempts that open the circuit
+            reset_timeout: seconds an open circuit waits before a trial call
+            pool_size: keep-alive connections kept per gateway URL
         """
         self.api_key = api_key
-        self.base_url = "https://api.payment-gateway.example.com"
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        if self.base_url is not None:
+            self._session = _shared_session(self.base_url, pool_size)
+            self._breaker = _shared_breaker(self.base_url, failure_threshold, reset_timeout)
+    
+    def get_metrics(self) -> Dict:
+        """Gateway call metrics; see get_gateway_metrics()."""
+        return get_gateway_metrics()
+    
+    def _request(self, operation: str, method: str, path: str, payload: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """
+        Send one logical JSON request with retries; return (HTTP status, decoded body).
+        
+        Raises GatewayUnavailableError if no definitive answer was obtained.
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}", "Accept": "application/json"}
+        if method == "POST":
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+        
+        last_error = "no attempt made"
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                METRICS.record_retry(operation)
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))))
+            if not self._breaker.allow():
+                METRICS.record_rejected(operation)
+                raise GatewayUnavailableError("Payment gateway unavailable (circuit open)")
+            
+            started = time.perf_counter()
+            try:
+                response = self._session.request(
+                    method, self.base_url + path, json=payload, headers=headers, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                elapsed = time.perf_counter() - started
+                instrumentation.add_timing("gateway", elapsed)
+                GATEWAY_LATENCY.observe(elapsed, operation=operation, outcome="error")
+                METRICS.record_call(operation, elapsed, ok=False)
+                self._breaker.record_failure()
+                last_error = f"Gateway request failed: {e.__class__.__name__}"
+                continue
+            
+            elapsed = time.perf_counter() - started
+            instrumentation.add_timing("gateway", elapsed)
+            if response.status_code == 429 or response.status_code >= 500:
+                GATEWAY_LATENCY.observe(elapsed, operation=operation, outcome="error")
+                METRICS.record_call(operation, elapsed, ok=False)
+                self._breaker.record_failure()
+                last_error = f"Gateway returned HTTP {response.status_code}"
+                continue
+            
+            # Any other answer (including a 4xx decline) means the gateway is healthy.
+            GATEWAY_LATENCY.observe(elapsed, operation=operation, outcome="ok")
+            METRICS.record_call(operation, elapsed, ok=True)
+            self._breaker.record_success()
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            return response.status_code, data if isinstance(data, dict) else {}
+        
+        raise GatewayUnavailableError(last_error)
     
     def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
         """
@@ -51,36 +352,25 @@ class PaymentGateway:
             gateway = PaymentGateway()
             success, txn_id, msg = gateway.process_payment("123456", 10.50, "Late fees")
         """
-        # Simulate API call delay
-        time.sleep(0.5)
-        
-        # In a real implementation, this would make an HTTP request:
-        # response = requests.post(
-        #     f"{self.base_url}/charges",
-        #     headers={"Authorization": f"Bearer {self.api_key}"},
-        #     json={
-        #         "customer_id": patron_id,
-        #         "amount": amount,
-        #         "currency": "usd",
-        #         "description": description
-        #     }
-        # )
-        
-        # For this template, we simulate different scenarios based on amount
-        # This allows testing without a real API
-        
-        if amount <= 0:
-            return False, "", "Invalid amount: must be greater than 0"
-        
-        if amount > 1000:
-            return False, "", "Payment declined: amount exceeds limit"
-        
-        if len(patron_id) != 6:
-            return False, "", "Invalid patron ID format"
+        if self.base_url is None:
+            # Simulate API call delay
+            time.sleep(0.5)
+            # Simulate different scenarios based on amount so this can be
+            # exercised without a real API
+            return _simulate_payment(patron_id, amount)
         
-        # Simulate successful payment
-        transaction_id = f"txn_{patron_id}_{int(time.time())}"
-        return True, transaction_id, f"Payment of ${amount:.2f} processed successfully"
+        try:
+            status, data = self._request("charge", "POST", "/charges", {
+                "customer_id": patron_id,
+                "amount": amount,
+                "currency": "usd",
+                "description": description
+            })
+        except GatewayUnavailableError as e:
+            return False, "", str(e)
+        if 200 <= status < 300 and data.get("id"):
+            return True, data["id"], data.get("message") or f"Payment of ${amount:.2f} processed successfully"
+        return False, "", data.get("error") or f"Gateway returned HTTP {status}"
     
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         """
@@ -96,16 +386,20 @@ class PaymentGateway:
         Returns:
             tuple: (success: bool, message: str)
         """
-        time.sleep(0.5)
+        if self.base_url is None:
+            time.sleep(0.5)
+            return _simulate_refund(transaction_id, amount)
         
-        if not transaction_id or not transaction_id.startswith("txn_"):
-            return False, "Invalid transaction ID"
-        
-        if amount <= 0:
-            return False, "Invalid refund amount"
-        
-        refund_id = f"refund_{transaction_id}_{int(time.time())}"
-        return True, f"Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}"
+        try:
+            status, data = self._request("refund", "POST", "/refunds", {
+                "transaction_id": transaction_id,
+                "amount": amount
+            })
+        except GatewayUnavailableError as e:
+            return False, str(e)
+        if 200 <= status < 300:
+            return True, data.get("message") or f"Refund of ${amount:.2f} processed successfully. Refund ID: {data.get('id')}"
+        return False, data.get("error") or f"Gateway returned HTTP {status}"
     
     def verify_payment_status(self, transaction_id: str) -> Dict:
         """
@@ -120,15 +414,103 @@ class PaymentGateway:
         Returns:
             dict: Payment status information
         """
-        time.sleep(0.3)
+        if self.base_url is None:
+            time.sleep(0.3)
+            return _simulate_status(transaction_id)
         
-        if not transaction_id or not transaction_id.startswith("txn_"):
+        try:
+            status, data = self._request("status", "GET", f"/charges/{quote(transaction_id, safe='')}")
+        except GatewayUnavailableError as e:
+            return {"status": "error", "message": str(e)}
+        if status == 404:
             return {"status": "not_found", "message": "Transaction not found"}
+        if not 200 <= status < 300:
+            return {"status": "error", "message": data.get("error") or f"Gateway returned HTTP {status}"}
+        return data
+
+
+class AsyncPaymentGateway:
+    """
+    asyncio client for the payment gateway, with the same methods and return
+    values as PaymentGateway but awaitable.
+
+    At most `max_concurrency` calls are in flight at once; extra callers wait
+    their turn instead of opening more connections.
+
+    With `base_url` set this is a thread-offload wrapper, not a non-blocking
+    client: each call runs the blocking PaymentGateway in the event loop's
+    default executor (asyncio.to_thread), so every in-flight call holds one
+    executor thread for its whole round trip. The event loop itself stays
+    free, and calls share that URL's keep-alive session, retries,
+    idempotency keys and circuit breaker, and fail with the same return
+    values. Keep `max_concurrency` within the executor's size. Without
+    `base_url`, the simulated gateway decisions of PaymentGateway are used
+    after an asyncio.sleep, which holds no thread.
+    
+    A single instance should be used from one event loop.
+    """
+    
+    def __init__(self, api_key: str = "test_key_12345", base_url: Optional[str] = None,
+                 max_concurrency: int = 10, timeout: float = 10.0, **gateway_options):
+        """
+        Args:
+            api_key: API key for authentication (default is test key)
+            base_url: gateway API root, e.g. "http://127.0.0.1:8081" (None = simulated)
+            max_concurrency: maximum calls in flight at once
+            timeout: seconds allowed for connecting and for reading a response, per attempt
+            gateway_options: further PaymentGateway settings (max_retries, backoff_base, ...)
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._gateway = None
+        if self.base_url is not None:
+            gateway_options.setdefault("pool_size", max_concurrency)
+            self._gateway = PaymentGateway(
+                api_key, self.base_url, connect_timeout=timeout, read_timeout=timeout, **gateway_options
+            )
+    
+    async def _call(self, method, *args):
+        """Run a blocking PaymentGateway method in a thread, within the concurrency limit."""
+        async with self._semaphore:
+            return await asyncio.to_thread(method, *args)
+    
+    async def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """
+        Process a payment through the external gateway.
+        
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str)
+        """
+        if self._gateway is None:
+            async with self._semaphore:
+                await asyncio.sleep(0.5)
+            return _simulate_payment(patron_id, amount)
+        return await self._call(self._gateway.process_payment, patron_id, amount, description)
+    
+    async def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """
+        Refund a previous payment.
+        
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if self._gateway is None:
+            async with self._semaphore:
+                await asyncio.sleep(0.5)
+            return _simulate_refund(transaction_id, amount)
+        return await self._call(self._gateway.refund_payment, transaction_id, amount)
+    
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """
+        Check the status of a payment transaction.
         
-        # Simulate status check
-        return {
-            "transaction_id": transaction_id,
-            "status": "completed",
-            "amount": 10.50,
-            "timestamp": time.time()
-        }
\ No newline at end of file
+        Returns:
+            dict: Payment status information
+        """
+        if self._gateway is None:
+            async with self._semaphore:
+                await asyncio.sleep(0.3)
+            return _simulate_status(transaction_id)
+        return await self._call(self._gateway.verify_payment_status, transaction_id)
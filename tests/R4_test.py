@@ -16,9 +16,8 @@ def test_return_rejects_unknown_book_id():
 
 def test_return_rejects_if_not_borrowed_by_that_patron():
     success, message = return_book_by_patron("555555", 1)
-    assert success is True
-    msg = message.lower()
-    assert ("not borrowed" in msg) or ("returned" in msg)
+    assert success is False
+    assert "no active borrow record" in message.lower()
 
 def test_return_if_borrowed_or_not_borroweds():
     success, message = return_book_by_patron("123456", 1)
@@ -26,4 +25,4 @@ def test_return_if_borrowed_or_not_borroweds():
     if success:
         assert "return" in message.lower()
     else:
-        assert "not borrowed" in message.lower() 
\ No newline at end of file
+        assert "no active borrow record" in message.lower()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import sys
+import os
+import asyncio
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+from services.payment_service import AsyncPaymentGateway
+
+
+def test_async_gateway_charge_refund_and_status(fake_gateway):
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+
+    async def scenario():
+        ok, txn, msg = await gateway.process_payment("123456", 6.5, "Late fees")
+        status = await gateway.verify_payment_status(txn)
+        refunded = await gateway.refund_payment(txn, 6.5)
+        return ok, txn, msg, status, refunded
+
+    ok, txn, msg, status, refunded = asyncio.run(scenario())
+    assert ok is True and txn.startswith("txn_123456") and "6.50" in msg
+    assert status["status"] == "completed"
+    assert refunded[0] is True
+    method, path, headers, payload = fake_gateway.requests[0]
+    assert (method, path) == ("POST", "/charges")
+    assert headers["Authorization"] == "Bearer test_key_12345"
+    assert payload["customer_id"] == "123456" and payload["currency"] == "usd"
+
+
+def test_async_gateway_reports_decline_and_missing_txn(fake_gateway):
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+    ok, txn, msg = asyncio.run(gateway.process_payment("123456", 5000.0))
+    assert ok is False and txn == "" and "declined" in msg
+    assert asyncio.run(gateway.verify_payment_status("txn_nope"))["status"] == "not_found"
+
+
+def test_async_gateway_bounds_concurrency(fake_gateway):
+    fake_gateway.delay = 0.05
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url, max_concurrency=2)
+
+    async def burst():
+        return await asyncio.gather(*(gateway.process_payment("123456", 1.0) for _ in range(6)))
+
+    results = asyncio.run(burst())
+    assert all(ok for ok, _, _ in results)
+    assert fake_gateway.max_in_flight <= 2
+
+
+def test_pay_late_fees_async_uses_gateway(monkeypatch, stub_book_found, stub_fee, fake_gateway):
+    stub_fee(monkeypatch, amt=4.50)
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+
+    ok, msg, txn = asyncio.run(ls.pay_late_fees_async("700002", 42, payment_gateway=gateway))
+
+    assert ok is True and "Payment successful" in msg and txn.startswith("txn_700002")
+    assert fake_gateway.requests[0][3]["description"] == "Late fees for 'Clean Code'"
+
+
+def test_pay_late_fees_async_validates_before_gateway(monkeypatch, stub_book_found, stub_fee, fake_gateway):
+    stub_fee(monkeypatch, amt=0.0)
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+    ok, msg, txn = asyncio.run(ls.pay_late_fees_async("700002", 42, payment_gateway=gateway))
+    assert ok is False and "No late fees" in msg and fake_gateway.requests == []
+
+
+def test_refund_async_success_and_failure(fake_gateway):
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+    ok, txn, _ = asyncio.run(gateway.process_payment("123456", 3.0))
+
+    assert asyncio.run(ls.refund_late_fee_payment_async(txn, 3.0, payment_gateway=gateway))[0] is True
+    ok, msg = asyncio.run(ls.refund_late_fee_payment_async("txn_unknown", 3.0, payment_gateway=gateway))
+    assert ok is False and "Refund failed" in msg
+    ok, msg = asyncio.run(ls.refund_late_fee_payment_async("bad", 3.0, payment_gateway=gateway))
+    assert ok is False and msg == "Invalid transaction ID."
+
+
+def test_async_gateway_connection_error_returns_failure_values():
+    gateway = AsyncPaymentGateway(base_url="http://127.0.0.1:1", timeout=1.0, max_retries=0)
+
+    ok, txn, msg = asyncio.run(gateway.process_payment("123456", 2.0))
+    assert ok is False and txn == "" and "Gateway request failed" in msg
+    assert asyncio.run(gateway.verify_payment_status("txn_1"))["status"] == "error"
+    ok, msg = asyncio.run(ls.refund_late_fee_payment_async("txn_1", 2.0, payment_gateway=gateway))
+    assert ok is False and "Refund failed" in msg
+
+
+def test_async_gateway_reuses_connections_and_quotes_ids(fake_gateway):
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url, max_concurrency=1)
+
+    async def scenario():
+        for _ in range(3):
+            await gateway.process_payment("123456", 1.0)
+        return await gateway.verify_payment_status("txn_1\r\nX-Injected: 1")
+
+    assert asyncio.run(scenario())["status"] == "not_found"
+    assert fake_gateway.connections == 1
+    assert all("Idempotency-Key" in headers for method, _, headers, _ in fake_gateway.requests if method == "POST")
+    method, path, headers, _ = fake_gateway.requests[-1]
+    assert path == "/charges/txn_1%0D%0AX-Injected%3A%201" and "X-Injected" not in headers
+
+
+def test_async_payment_keeps_database_work_off_the_event_loop(monkeypatch, stub_book_found, temp_db, fake_gateway):
+    threads = []
+
+    def _owed(pid, bid):
+        threads.append(threading.current_thread())
+        return {"fee_amount": 2.0, "days_overdue": 4, "status": "OK"}, []
+    monkeypatch.setattr(ls, "_late_fee_owed_for_book", _owed)
+    real_record = ls._record_single_fee_payment
+    monkeypatch.setattr(ls, "_record_single_fee_payment",
+                        lambda *args: threads.append(threading.current_thread()) or real_record(*args))
+    gateway = AsyncPaymentGateway(base_url=fake_gateway.base_url)
+
+    ok, _, txn = asyncio.run(ls.pay_late_fees_async("700003", 42, payment_gateway=gateway))
+
+    assert ok is True and temp_db.get_payment_transaction(txn)["status"] == "completed"
+    assert len(threads) == 2 and threading.main_thread() not in threads
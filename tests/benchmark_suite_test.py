@@ -0,0 +1,79 @@
+import json
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+import instrumentation
+import run_benchmarks
+
+
+def test_compare_flags_only_slowdowns_beyond_threshold():
+    baseline = {"1k": {"search_title": {"p95_ms": 2.0}, "borrow_book": {"p95_ms": 1.0}}}
+    results = {"1k": {
+        "search_title": {"p95_ms": 2.4},   # +20%: within threshold
+        "borrow_book": {"p95_ms": 1.5},    # +50%: regression
+        "get_all_books": {"p95_ms": 9.0},  # not in baseline
+    }}
+
+    regressions = run_benchmarks.compare(results, baseline, threshold=0.25)
+
+    assert len(regressions) == 1 and regressions[0].startswith("1k/borrow_book")
+
+
+def test_run_scale_reports_every_benchmark(temp_db):
+    results = run_benchmarks.run_scale(200, runs=5, budget=1.0)
+
+    assert set(results) == {
+        "search_title", "search_author", "search_isbn", "search_cached", "patron_status_report",
+        "borrow_book", "return_book", "get_all_books",
+    }
+    for stats in results.values():
+        assert stats["runs"] >= 5 and stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+@pytest.mark.parametrize("term, search_type", [
+    ("Gatsby", "title"), ("Orwell", "author"), ("9780743273565", "isbn"),
+])
+def test_uncached_search_reaches_the_database_every_time(temp_db, term, search_type):
+    assert run_benchmarks.uncached_search(term, search_type)
+
+    # A repeat must not be answered from the search result or book caches
+    with instrumentation.track() as stats:
+        assert run_benchmarks.uncached_search(term, search_type)
+    assert stats.sql_statements >= 1
+
+    run_benchmarks.search_books_in_catalog(term, search_type)
+    with instrumentation.track() as stats:
+        run_benchmarks.search_books_in_catalog(term, search_type)
+    assert stats.sql_statements == 0
+
+
+def test_search_cached_times_only_cache_hits(temp_db, monkeypatch):
+    from services import library_service as ls
+    misses = []
+    real_measure = run_benchmarks.measure
+
+    def measure(op, runs, budget):
+        before = ls.get_search_cache_stats()["misses"]
+        samples = real_measure(op, runs, budget)
+        misses.append(ls.get_search_cache_stats()["misses"] - before)
+        return samples
+    monkeypatch.setattr(run_benchmarks, "measure", measure)
+
+    results = run_benchmarks.run_scale(200, runs=20, budget=1.0)
+
+    # measure() runs in benchmark order; search_cached is the fourth
+    assert list(results).index("search_cached") == 3
+    assert misses[3] == 0
+
+
+def test_committed_baseline_covers_every_benchmark(temp_db):
+    path = os.path.join(os.path.dirname(run_benchmarks.__file__), "baseline.json")
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    results = run_benchmarks.run_scale(200, runs=5, budget=1.0)
+
+    assert set(baseline) == {"1k"} and set(baseline["1k"]) == set(results)
+    assert all(stats["p95_ms"] > 0 for stats in baseline["1k"].values())
@@ -0,0 +1,55 @@
+import sys
+import os
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cache import LRUCache
+from services import library_service as ls
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["hits"] == 3 and stats["misses"] == 1
+
+
+def test_lru_entries_expire_after_ttl():
+    cache = LRUCache(max_size=4, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_book_lookups_are_served_from_cache(temp_db):
+    temp_db.configure_book_cache()
+    first = temp_db.get_book_by_id(1)
+    created = temp_db.get_pool_stats()["created"] + temp_db.get_pool_stats()["reused"]
+
+    assert temp_db.get_book_by_id(1) == first
+    assert temp_db.get_book_by_isbn(first["isbn"]) == first
+    checkouts = temp_db.get_pool_stats()["created"] + temp_db.get_pool_stats()["reused"]
+    assert checkouts == created
+    assert temp_db.get_book_cache_stats()["hits"] >= 2
+
+
+def test_cached_copy_cannot_be_mutated_by_callers(temp_db):
+    temp_db.get_book_by_id(2)["title"] = "scribbled"
+    assert temp_db.get_book_by_id(2)["title"] == "To Kill a Mockingbird"
+
+
+def test_writes_invalidate_cached_books(temp_db):
+    before = temp_db.get_book_by_id(1)["available_copies"]
+
+    ls.borrow_book_by_patron("700050", 1)
+    assert temp_db.get_book_by_id(1)["available_copies"] == before - 1
+
+    ls.return_book_by_patron("700050", 1)
+    assert temp_db.get_book_by_id(1)["available_copies"] == before
+
+    temp_db.update_book_availability(1, -1)
+    assert temp_db.get_book_by_isbn("9780743273565")["available_copies"] == before - 1
@@ -0,0 +1,46 @@
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+def test_borrow_decrements_and_records_loan(temp_db):
+    before = temp_db.get_book_by_id(1)["available_copies"]
+    ok, msg = ls.borrow_book_by_patron("700010", 1)
+    assert ok is True and "The Great Gatsby" in msg
+    assert temp_db.get_book_by_id(1)["available_copies"] == before - 1
+    assert temp_db.get_patron_borrow_count("700010") == 1
+
+
+def test_borrow_rejects_when_no_copies_left(temp_db):
+    ok, msg = ls.borrow_book_by_patron("700010", 3)  # sample data lends out book 3
+    assert ok is False and "not available" in msg
+    assert temp_db.get_patron_borrow_count("700010") == 0
+
+
+def test_concurrent_borrows_never_oversell(temp_db):
+    temp_db.insert_book("Last Copy", "Author", "9789999999999", 1, 1)
+    book_id = temp_db.get_book_by_isbn("9789999999999")["id"]
+    results = []
+
+    def worker(n):
+        results.append(ls.borrow_book_by_patron(f"8000{n:02d}", book_id)[0])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(True) == 1
+    assert temp_db.get_book_by_id(book_id)["available_copies"] == 0
+
+
+def test_borrow_reports_lock_wait(temp_db):
+    result = temp_db.borrow_book_atomic(
+        "700011", 1, datetime.now(), datetime.now() + timedelta(days=14), 5
+    )
+    assert result["status"] == "ok" and result["lock_wait_ms"] >= 0
+    assert temp_db.get_transaction_stats()["transactions"] >= 1
@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+from services import bulk_import
+
+
+def test_bulk_add_reports_per_row_errors(temp_db):
+    rows = [
+        {"title": "Dune", "author": "Frank Herbert", "isbn": "9780441013593", "total_copies": 2},
+        {"title": "", "author": "Nobody", "isbn": "9780000000001", "total_copies": 1},
+        {"title": "Gatsby again", "author": "F. Scott", "isbn": "9780743273565", "total_copies": 1},
+        {"title": "Dune copy", "author": "Frank Herbert", "isbn": "9780441013593", "total_copies": 1},
+        {"title": "Emma", "author": "Jane Austen", "isbn": "9780141439587", "total_copies": 0},
+        {"title": "Persuasion", "author": "Jane Austen", "isbn": "9780141439686", "total_copies": 3},
+    ]
+
+    report = ls.bulk_add_books(rows, batch_size=2)
+
+    assert report["total"] == 6 and report["inserted"] == 2 and report["failed"] == 4
+    by_row = {e["row"]: e["error"] for e in report["errors"]}
+    assert by_row[1] == "Title is required."
+    assert by_row[2] == "A book with this ISBN already exists."
+    assert "Duplicate ISBN" in by_row[3]
+    assert "positive integer" in by_row[4]
+    assert temp_db.get_book_by_isbn("9780141439686")["available_copies"] == 3
+    assert report["rows_per_second"] >= 0
+
+
+def test_bulk_add_database_error_marks_batch(monkeypatch):
+    monkeypatch.setattr(ls, "insert_books_bulk", lambda rows: None)
+    report = ls.bulk_add_books([{"title": "T", "author": "A", "isbn": "1234567890123", "total_copies": 1}])
+    assert report["inserted"] == 0
+    assert report["errors"][0]["error"] == "Database error occurred while adding the book."
+
+
+def test_cli_imports_csv(temp_db, tmp_path, capsys):
+    path = tmp_path / "books.csv"
+    path.write_text(
+        "title,author,isbn,total_copies\n"
+        "Middlemarch,George Eliot,9780141439549,2\n"
+        "Bad Copies,Someone,9780141439550,two\n"
+    )
+
+    code = bulk_import.main([str(path), "--batch-size", "10"])
+
+    out = capsys.readouterr()
+    assert code == 1
+    assert "Imported 1 of 2 rows" in out.out
+    assert "line 3" in out.err
+    assert temp_db.get_book_by_isbn("9780141439549")["title"] == "Middlemarch"
+
+
+def test_import_api_reports_mistyped_fields_per_row(temp_db):
+    from app import create_app
+    client = create_app().test_client()
+
+    resp = client.post("/api/books/import", json={"books": [
+        {"title": "Numbers", "author": "Someone", "isbn": 9780000000001, "total_copies": 1},
+        {"title": 5, "author": "Someone", "isbn": "9780000000002", "total_copies": 1},
+        {"title": "Kindred", "author": ["Octavia Butler"], "isbn": "9780000000003", "total_copies": 1},
+        {"title": "Beloved", "author": "Toni Morrison", "isbn": "9781400033416", "total_copies": 1},
+    ]})
+
+    assert resp.status_code == 200
+    report = resp.get_json()
+    assert report["inserted"] == 1 and report["failed"] == 3
+    assert [e["error"] for e in report["errors"]] == [
+        "ISBN must be text.", "Title must be text.", "Author must be text."
+    ]
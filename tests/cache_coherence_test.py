@@ -0,0 +1,73 @@
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _external_write(db, sql, params=()):
+    """Write through a connection the module knows nothing about, like another worker would."""
+    other = sqlite3.connect(db.DATABASE)
+    other.execute(sql, params)
+    other.commit()
+    other.close()
+
+
+def test_catalog_version_moves_on_book_writes(temp_db):
+    start = temp_db.get_catalog_version(force=True)
+    temp_db.insert_book("Version Test", "Author", "9781111111111", 1, 1)
+    temp_db.update_book_availability(1, -1)
+    assert temp_db.get_catalog_version(force=True) == start + 2
+
+
+def test_external_write_invalidates_cached_book(temp_db, monkeypatch):
+    monkeypatch.setattr(temp_db, "COHERENCE_CHECK_INTERVAL", 0.0)
+    temp_db.close_pool()
+    assert temp_db.get_book_by_id(1)["title"] == "The Great Gatsby"
+
+    _external_write(temp_db, "UPDATE books SET title = 'Gatsby (2nd ed.)' WHERE id = 1")
+
+    assert temp_db.get_book_by_id(1)["title"] == "Gatsby (2nd ed.)"
+    assert temp_db.get_coherence_stats()["changes"] == 1
+
+
+def test_check_interval_limits_version_reads(temp_db, monkeypatch):
+    monkeypatch.setattr(temp_db, "COHERENCE_CHECK_INTERVAL", 60.0)
+    temp_db.close_pool()
+    temp_db.get_book_by_id(1)
+    _external_write(temp_db, "UPDATE books SET title = 'Stale' WHERE id = 1")
+
+    # Within the interval the cached row is still served; a forced check catches up.
+    assert temp_db.get_book_by_id(1)["title"] == "The Great Gatsby"
+    temp_db.get_catalog_version(force=True)
+    assert temp_db.get_book_by_id(1)["title"] == "Stale"
+
+
+def test_borrow_record_writes_do_not_move_catalog_version(temp_db):
+    start = temp_db.get_catalog_version(force=True)
+    _external_write(temp_db, "UPDATE borrow_records SET patron_id = '999999'")
+    assert temp_db.get_catalog_version(force=True) == start
+
+
+def test_local_writes_keep_other_cached_books(temp_db, monkeypatch):
+    monkeypatch.setattr(temp_db, "COHERENCE_CHECK_INTERVAL", 0.0)
+    temp_db.close_pool()
+    from services.library_service import borrow_book_by_patron, return_book_by_patron
+    temp_db.get_book_by_id(1), temp_db.get_book_by_id(2)
+    start = temp_db.get_catalog_version()
+    invalidations = temp_db.get_book_cache_stats()["invalidations"]
+
+    assert borrow_book_by_patron("700031", 1)[0]
+    assert return_book_by_patron("700031", 1)[0]
+    temp_db.get_book_by_id(2)
+
+    stats = temp_db.get_book_cache_stats()
+    assert stats["size"] == 1 and stats["invalidations"] - invalidations == 1  # book 2 survived
+    assert temp_db.get_coherence_stats()["changes"] == 0
+    assert temp_db.get_catalog_version() == start + 2
+
+    # A write from elsewhere in between a local one still clears everything.
+    _external_write(temp_db, "UPDATE books SET title = 'Moby-Dick (Annotated)' WHERE id = 3")
+    assert temp_db.update_book_availability(1, 0)
+    assert temp_db.get_book_by_id(2)
+    assert temp_db.get_coherence_stats()["changes"] == 1
+    assert temp_db.get_book_cache_stats()["size"] == 1
@@ -0,0 +1,31 @@
+import sys
+import os
+import csv
+import io
+import json
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def test_iter_books_walks_all_batches(temp_db):
+    for i in range(7):
+        temp_db.insert_book(f"Export {i}", "Author", f"{9791000000000 + i}", 1, 1)
+    ids = [b["id"] for b in temp_db.iter_books(batch_size=3)]
+    assert ids == sorted(ids) and len(ids) == 10
+    assert temp_db.get_pool_stats()["in_use"] == 0
+
+
+def test_export_ndjson_and_csv(temp_db):
+    from app import create_app
+    client = create_app().test_client()
+
+    resp = client.get("/api/books/export?format=ndjson")
+    assert resp.status_code == 200 and resp.is_streamed
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [b["isbn"] for b in lines] == ["9780743273565", "9780061120084", "9780451524935"]
+
+    resp = client.get("/api/books/export?format=csv")
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert resp.mimetype == "text/csv"
+    assert len(rows) == 3 and rows[2]["title"] == "1984"
+
+    assert client.get("/api/books/export?format=xml").status_code == 400
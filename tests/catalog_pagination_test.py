@@ -0,0 +1,61 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _seed(db, n):
+    for i in range(n):
+        # Repeated titles make the id tiebreaker matter.
+        db.insert_book(f"Book {i % 4}", "Author", f"{9790000000000 + i}", 1, 1)
+
+
+def test_pages_cover_catalog_once_in_order(temp_db):
+    _seed(temp_db, 11)
+    seen, cursor = [], None
+    while True:
+        page = temp_db.get_books_page(cursor, limit=4)
+        seen.extend(page["books"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    expected = sorted(temp_db.get_all_books(), key=lambda b: (b["title"], b["id"]))
+    assert [b["id"] for b in seen] == [b["id"] for b in expected]
+
+
+def test_last_page_has_no_cursor(temp_db):
+    page = temp_db.get_books_page(None, limit=10)
+    assert len(page["books"]) == 3
+    assert page["next_cursor"] is None
+
+
+def test_malformed_cursor_rejected(temp_db):
+    with pytest.raises(ValueError):
+        temp_db.get_books_page("not-a-cursor", limit=5)
+
+
+def test_deep_page_uses_index_range(temp_db):
+    conn = temp_db.get_db_connection()
+    try:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM books WHERE (title, id) > (?, ?) "
+            "ORDER BY title, id LIMIT 5",
+            ("M", 1),
+        ).fetchall()
+    finally:
+        conn.close()
+    detail = " ".join(row["detail"] for row in plan)
+    assert "idx_books_title_id" in detail
+    assert "TEMP B-TREE" not in detail
+
+
+def test_api_books_endpoint_pages(temp_db):
+    from app import create_app
+    client = create_app().test_client()
+
+    first = client.get("/api/books?limit=2").get_json()
+    assert first["count"] == 2 and first["next_cursor"]
+    second = client.get(f"/api/books?limit=2&after={first['next_cursor']}").get_json()
+    assert second["count"] == 1 and second["next_cursor"] is None
+    assert client.get("/api/books?after=garbage").status_code == 400
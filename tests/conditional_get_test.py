@@ -0,0 +1,51 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+@pytest.fixture
+def client(temp_db):
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize("url", ["/catalog", "/search?q=gatsby&type=title", "/api/search?q=gatsby"])
+def test_unchanged_catalog_answers_304_without_queries(client, monkeypatch, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"catalog-') and not etag.startswith("W/")
+
+    def no_render(*args, **kwargs):
+        raise AssertionError("rendered a page for a matching ETag")
+    monkeypatch.setattr("flask.templating._render", no_render)
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+    assert 'desc="0 queries"' in again.headers["Server-Timing"]
+
+
+def test_catalog_change_gives_a_new_etag(client):
+    etag = client.get("/api/search?q=gatsby").headers["ETag"]
+
+    book = ls.search_books_in_catalog("gatsby", "title")[0]
+    ok, _ = ls.borrow_book_by_patron("123456", book["id"])
+    assert ok
+
+    resp = client.get("/api/search?q=gatsby", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    assert resp.get_json()["results"][0]["available_copies"] == book["available_copies"] - 1
+
+
+def test_errors_and_pending_flashes_are_not_tagged(client):
+    resp = client.get("/api/search")
+    assert resp.status_code == 400 and "ETag" not in resp.headers
+
+    etag = client.get("/catalog").headers["ETag"]
+    with client.session_transaction() as session:
+        session["_flashes"] = [("success", "Book added.")]
+    resp = client.get("/catalog", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and b"Book added." in resp.data
@@ -2,6 +2,7 @@ import pytest
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from datetime import datetime, timedelta
 from unittest.mock import Mock
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]  
@@ -22,11 +23,11 @@ def stub_book_missing(monkeypatch):
 
 @pytest.fixture
 def stub_fee():
-    """Factory to stub calculate_late_fee_for_book with a chosen fee."""
+    """Factory to stub the per-book fee lookup used by pay_late_fees with a chosen fee."""
     def _factory(monkeypatch, amt=0.0):
         def _calc(_pid, _bid):
-            return {"fee_amount": amt, "days_overdue": 0, "status": "ok"}
-        monkeypatch.setattr(ls, "calculate_late_fee_for_book", _calc)
+            return {"fee_amount": amt, "days_overdue": 0, "status": "ok"}, []
+        monkeypatch.setattr(ls, "_late_fee_owed_for_book", _calc)
     return _factory
 
 @pytest.fixture
@@ -37,3 +38,155 @@ def gateway_mock():
     refund_payment(txn_id, amount) -> (success, message)
     """
     return Mock()
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database module at a fresh file seeded with sample data."""
+    import database
+    database.close_pool()
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    monkeypatch.setattr(database, "_DB_BOOTSTRAPPED", False)
+    for setting in ("POOL_SIZE", "POOL_TIMEOUT", "POOL_HEALTH_CHECK_INTERVAL"):
+        monkeypatch.setattr(database, setting, getattr(database, setting))
+    yield database
+    database.close_pool()
+
+
+@pytest.fixture
+def add_loan(temp_db):
+    """
+    Factory to insert a 14-day borrow record into the temp database.
+
+    `days_overdue` is how far past its due date the loan is (negative: due
+    in the future). `returned` closes it on its due date; `take_copy` also
+    takes a copy off the shelf, as a real checkout would.
+    """
+    def _add(patron_id, book_id, days_overdue=0, returned=False, take_copy=False):
+        due = datetime.now() - timedelta(days=days_overdue, hours=1)
+        conn = temp_db.get_db_connection()
+        conn.execute(
+            "INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (patron_id, book_id, (due - timedelta(days=14)).isoformat(), due.isoformat(),
+             due.isoformat() if returned else None),
+        )
+        if take_copy:
+            conn.execute("UPDATE books SET available_copies = available_copies - 1 WHERE id = ?", (book_id,))
+        conn.commit()
+        conn.close()
+    return _add
+
+
+class FakeGatewayServer:
+    """
+    Local stand-in for the payment gateway HTTP API.
+
+    POST /charges, POST /refunds and GET /charges/<id> answer with JSON like
+    the real service. `delay` slows every response, `fail_next` makes that
+    many upcoming requests answer 503, and `requests` records what arrived.
+    Connections are kept alive; `connections` counts how many were opened.
+    """
+
+    def __init__(self):
+        import threading
+        from http.server import ThreadingHTTPServer
+        self.delay = 0.0
+        self.fail_next = 0
+        self.requests = []
+        self.charges = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def _handler(self):
+        import json
+        import time
+        from http.server import BaseHTTPRequestHandler
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (timeout tests)
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests.append((self.command, self.path, dict(self.headers), payload))
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                    failing = fake.fail_next > 0
+                    if failing:
+                        fake.fail_next -= 1
+                try:
+                    time.sleep(fake.delay)
+                    if failing:
+                        return self._reply(503, {"error": "Gateway unavailable"})
+                    return self._route(payload)
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+            def _route(self, payload):
+                if self.command == "POST" and self.path == "/charges":
+                    if payload["amount"] > 1000:
+                        return self._reply(402, {"error": "Payment declined: amount exceeds limit"})
+                    key = self.headers.get("Idempotency-Key")
+                    with fake._lock:
+                        existing = next((t for t, c in fake.charges.items() if key and c.get("key") == key), None)
+                        txn = existing or f"txn_{payload['customer_id']}_{len(fake.charges) + 1}"
+                        fake.charges[txn] = {"amount": payload["amount"], "status": "completed", "key": key}
+                    return self._reply(200, {"id": txn, "message": f"Payment of ${payload['amount']:.2f} processed successfully"})
+                if self.command == "POST" and self.path == "/refunds":
+                    charge = fake.charges.get(payload["transaction_id"])
+                    if charge is None:
+                        return self._reply(404, {"error": "Transaction not found"})
+                    charge["status"] = "refunded"
+                    return self._reply(200, {"id": f"refund_{payload['transaction_id']}", "message": f"Refund of ${payload['amount']:.2f} processed successfully"})
+                if self.command == "GET" and self.path.startswith("/charges/"):
+                    txn = self.path.rsplit("/", 1)[1]
+                    charge = fake.charges.get(txn)
+                    if charge is None:
+                        return self._reply(404, {"error": "Transaction not found"})
+                    return self._reply(200, {"transaction_id": txn, "status": charge["status"], "amount": charge["amount"]})
+                return self._reply(404, {"error": "Not found"})
+
+            do_GET = _handle
+            do_POST = _handle
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_gateway():
+    """A running FakeGatewayServer; see its docstring."""
+    server = FakeGatewayServer()
+    yield server
+    server.close()
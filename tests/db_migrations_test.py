@@ -0,0 +1,63 @@
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import database
+
+
+def _index_names(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    return {r[0] for r in rows}
+
+
+def test_fresh_database_is_at_latest_version(temp_db):
+    conn = temp_db.get_db_connection()
+    try:
+        assert temp_db.get_schema_version(conn) == temp_db.SCHEMA_VERSION
+        names = _index_names(conn)
+        assert "idx_borrow_records_patron_return" in names
+        assert "idx_borrow_records_book_return" in names
+        assert "idx_borrow_records_active" in names
+    finally:
+        conn.close()
+
+
+def test_legacy_database_upgrades_in_place(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute(
+        "CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, "
+        "author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, "
+        "available_copies INTEGER NOT NULL)"
+    )
+    legacy.execute(
+        "CREATE TABLE borrow_records (id INTEGER PRIMARY KEY AUTOINCREMENT, patron_id TEXT NOT NULL, "
+        "book_id INTEGER NOT NULL, borrow_date TEXT NOT NULL, due_date TEXT NOT NULL, return_date TEXT)"
+    )
+    legacy.execute("INSERT INTO books VALUES (1, 'Old', 'Author', '1111111111111', 1, 1)")
+    legacy.commit()
+    assert database.get_schema_version(legacy) == 0
+
+    legacy.row_factory = sqlite3.Row
+    database.ensure_schema(legacy)
+    assert database.get_schema_version(legacy) == database.SCHEMA_VERSION
+    assert legacy.execute("SELECT title FROM books WHERE id = 1").fetchone()["title"] == "Old"
+
+    # Running again is a no-op.
+    assert database.apply_migrations(legacy) == database.SCHEMA_VERSION
+    legacy.close()
+
+
+def test_active_loan_queries_use_indexes(temp_db):
+    conn = temp_db.get_db_connection()
+    try:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM borrow_records "
+            "WHERE patron_id = ? AND return_date IS NULL",
+            ("123456",),
+        ).fetchall()
+        detail = " ".join(row["detail"] for row in plan)
+        assert "USING" in detail and "INDEX" in detail
+        assert "SCAN borrow_records" not in detail
+    finally:
+        conn.close()
@@ -0,0 +1,72 @@
+import sys
+import os
+import threading
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import database
+
+
+def test_pool_reuses_connections_across_helpers(temp_db):
+    temp_db.get_book_by_id(1)
+    temp_db.get_patron_borrow_count("123456")
+    temp_db.get_book_by_isbn("9780451524935")
+
+    stats = temp_db.get_pool_stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_pool_close_returns_instead_of_closing(temp_db):
+    conn = temp_db.get_db_connection()
+    conn.close()
+    again = temp_db.get_db_connection()
+    try:
+        assert again is conn
+        assert again.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        again.close()
+
+
+def test_pool_rolls_back_uncommitted_work_on_release(temp_db):
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE books SET available_copies = 99 WHERE id = 1")
+    conn.close()
+    assert temp_db.get_book_by_id(1)["available_copies"] != 99
+
+
+def test_pool_bounded_size_times_out(temp_db):
+    temp_db.configure_pool(size=1, timeout=0.05)
+    held = temp_db.get_db_connection()
+    with pytest.raises(database.PoolTimeoutError):
+        temp_db.get_db_connection()
+    held.close()
+    stats = temp_db.get_pool_stats()
+    assert stats["waits"] == 1 and stats["timeouts"] == 1
+
+
+def test_pool_waiter_gets_released_connection(temp_db):
+    temp_db.configure_pool(size=1, timeout=2.0)
+    held = temp_db.get_db_connection()
+    got = []
+    t = threading.Thread(target=lambda: got.append(temp_db.get_db_connection()))
+    t.start()
+    held.close()
+    t.join(timeout=2)
+    assert got and got[0] is held
+    got[0].close()
+
+
+def test_pool_health_check_replaces_dead_connection(temp_db):
+    temp_db.configure_pool(health_check_interval=0.0)
+    conn = temp_db.get_db_connection()
+    conn.close()
+    super(database.PooledConnection, conn).close()
+
+    fresh = temp_db.get_db_connection()
+    try:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1").fetchone()[0] == 1
+    finally:
+        fresh.close()
+    assert temp_db.get_pool_stats()["discarded"] == 1
@@ -0,0 +1,79 @@
+import sys
+import os
+import sqlite3
+from datetime import date
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services.generate_data import generate_dataset
+
+AS_OF = date(2026, 1, 1)
+
+
+def _dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return (
+            conn.execute("SELECT * FROM books ORDER BY id").fetchall(),
+            conn.execute("SELECT * FROM borrow_records ORDER BY id").fetchall(),
+        )
+    finally:
+        conn.close()
+
+
+def test_same_seed_gives_same_data(temp_db, tmp_path, monkeypatch):
+    dumps = []
+    for name in ("a.db", "b.db"):
+        monkeypatch.setattr(temp_db, "DATABASE", str(tmp_path / name))
+        generate_dataset(books=300, patrons=50, loans=2000, seed=7, as_of=AS_OF)
+        dumps.append(_dump(temp_db.DATABASE))
+
+    assert dumps[0] == dumps[1]
+    assert len(dumps[0][0]) == 300 and len(dumps[0][1]) == 2000
+
+
+def test_generated_data_is_consistent(temp_db):
+    report = generate_dataset(books=500, patrons=100, loans=5000, seed=1, as_of=AS_OF, replace=True)
+    conn = temp_db.get_db_connection()
+    try:
+        assert conn.execute(
+            """
+            SELECT COUNT(*) FROM books b
+            WHERE available_copies != total_copies - (
+                SELECT COUNT(*) FROM borrow_records r WHERE r.book_id = b.id AND r.return_date IS NULL
+            )
+            """
+        ).fetchone()[0] == 0
+        assert conn.execute(
+            "SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM borrow_records WHERE return_date IS NULL GROUP BY patron_id)"
+        ).fetchone()[0] <= 5
+        top = conn.execute(
+            "SELECT COUNT(*) FROM borrow_records WHERE book_id = ?", (report['most_borrowed_book'],)
+        ).fetchone()[0]
+        assert top > 5000 / 500 * 10  # Zipf: the top title is far above the mean
+        # indexes, triggers and the FTS index are back after the load
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'books_fts_ai'").fetchone()[0] == 1
+        title = conn.execute("SELECT title FROM books WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+    assert temp_db.search_books_fts(title.split()[0], "title")
+
+
+def test_refuses_to_mix_with_existing_catalog(temp_db):
+    temp_db.get_all_books()  # bootstraps the sample books
+
+    with pytest.raises(ValueError):
+        generate_dataset(books=10, patrons=5, loans=10)
+
+
+def test_open_fraction_is_reached_despite_skew(temp_db):
+    report = generate_dataset(books=2000, patrons=200, loans=20000, seed=3, as_of=AS_OF,
+                              open_fraction=0.03, replace=True)
+    conn = temp_db.get_db_connection()
+    try:
+        open_loans = conn.execute("SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL").fetchone()[0]
+    finally:
+        conn.close()
+
+    assert report['open_loans'] == open_loans
+    assert report['open_fraction'] == open_loans / 20000
+    assert 0.025 < report['open_fraction'] < 0.035
@@ -0,0 +1,61 @@
+import sys
+import os
+import json
+import logging
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import instrumentation
+
+
+def test_track_counts_statements_and_rows(temp_db):
+    temp_db.get_all_books()  # bootstrap outside the measured block
+
+    with instrumentation.track() as stats:
+        books = temp_db.get_all_books()
+
+    assert stats.sql_statements == 1 and stats.sql_rows == len(books) == 3
+    assert stats.sql_seconds > 0
+
+
+def test_untracked_connections_use_plain_cursors(temp_db):
+    conn = temp_db.get_db_connection()
+    try:
+        cur = conn.execute("SELECT 1")
+        assert type(cur) is not instrumentation.InstrumentedCursor
+    finally:
+        conn.close()
+
+
+def test_request_gets_server_timing_and_log_line(temp_db, caplog):
+    from app import create_app
+    client = create_app().test_client()
+
+    with caplog.at_level(logging.INFO, logger="library.request"):
+        resp = client.get("/catalog")
+
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("db;dur=") and "render;dur=" in timing and "total;dur=" in timing
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry["endpoint"] == "catalog.catalog" and entry["blueprint"] == "catalog"
+    assert entry["status"] == 200 and entry["sql_statements"] >= 1 and entry["sql_rows"] >= 3
+
+
+def test_slow_queries_are_logged(temp_db, caplog):
+    from app import create_app
+    app = create_app()
+    app.config["SLOW_QUERY_MS"] = 0
+    client = app.test_client()
+
+    with caplog.at_level(logging.WARNING, logger="library.sql.slow"):
+        client.get("/api/books")
+
+    slow = [json.loads(r.getMessage()) for r in caplog.records if r.name == "library.sql.slow"]
+    assert slow and all(entry["event"] == "slow_query" for entry in slow)
+    assert any("FROM books" in entry["sql"] for entry in slow)
+
+
+def test_disabled_instrumentation_adds_no_header(temp_db):
+    from app import create_app
+    app = create_app()
+    app.config["INSTRUMENTATION"] = False
+
+    assert "Server-Timing" not in app.test_client().get("/api/books").headers
@@ -0,0 +1,57 @@
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import database
+from services import library_service as ls
+
+
+def test_hyphenated_isbns_match_through_the_index(temp_db):
+    assert temp_db.insert_book("Clean Code", "Robert Martin", "978-0-13-235088-4", 2, 2)
+
+    for term in ("9780132350884", "978 0132350884", "978-0-13-235088-4"):
+        rows = ls.search_books_in_catalog(term, "isbn")
+        assert [b["title"] for b in rows] == ["Clean Code"]
+    assert temp_db.get_book_by_isbn("978-0743273565")["title"] == "The Great Gatsby"
+    assert "isbn_normalized" not in rows[0]
+
+    conn = temp_db.get_db_connection()
+    try:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM books WHERE isbn_normalized = ?", ("9780132350884",)
+        ).fetchall()
+    finally:
+        conn.close()
+    assert "idx_books_isbn_normalized" in " ".join(row["detail"] for row in plan)
+
+
+def test_migration_backfills_existing_rows(tmp_path):
+    legacy = sqlite3.connect(str(tmp_path / "legacy.db"))
+    legacy.row_factory = sqlite3.Row
+    legacy.execute(
+        "CREATE TABLE books (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, "
+        "author TEXT NOT NULL, isbn TEXT UNIQUE NOT NULL, total_copies INTEGER NOT NULL, "
+        "available_copies INTEGER NOT NULL)"
+    )
+    legacy.execute("INSERT INTO books VALUES (1, 'Old', 'Author', '978-11111 1111', 1, 1)")
+    legacy.commit()
+
+    database.ensure_schema(legacy)
+
+    row = legacy.execute("SELECT isbn_normalized FROM books WHERE id = 1").fetchone()
+    assert row["isbn_normalized"] == "978111111111"
+    legacy.close()
+
+
+def test_rows_written_with_raw_sql_are_found_by_isbn(temp_db):
+    conn = temp_db.get_db_connection()
+    conn.execute(
+        "INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+        "VALUES ('Refactoring', 'Martin Fowler', '978-0-13-475759-9', 1, 1)"
+    )
+    conn.execute("UPDATE books SET isbn = '978 0451524935' WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    assert temp_db.get_book_by_isbn("9780134757599")["title"] == "Refactoring"
+    assert temp_db.get_book_by_isbn("9780451524935")["title"] == "1984"
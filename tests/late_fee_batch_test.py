@@ -0,0 +1,34 @@
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+def test_batch_prices_every_loan():
+    now = datetime(2025, 1, 31, 12, 0)
+    loans = [{"id": i, "due_date": now - timedelta(days=d)} for i, d in enumerate([-2, 0, 7, 8, 12, 30])]
+
+    priced = ls.calculate_late_fees_batch(loans, as_of=now)
+
+    assert [p["days_overdue"] for p in priced] == [0, 0, 7, 8, 12, 30]
+    assert [p["fee_amount"] for p in priced] == [0.0, 0.0, 3.5, 4.5, 8.5, 15.0]
+    assert priced[3]["id"] == 3
+
+
+def test_overdue_run_only_prices_open_overdue_loans(temp_db, add_loan):
+    add_loan("700030", 1, days_overdue=9)
+    add_loan("700031", 2, days_overdue=1)
+
+    fees = {f["patron_id"]: f["fee_amount"] for f in ls.calculate_overdue_fees()}
+
+    assert fees == {"700030": 5.5, "700031": 0.5}
+
+
+def test_per_book_fee_wraps_batch(temp_db, add_loan):
+    add_loan("700032", 2, days_overdue=4)
+    assert ls.calculate_late_fee_for_book("700032", 2) == {
+        "fee_amount": 2.0, "days_overdue": 4, "status": "OK"
+    }
+    assert ls.calculate_late_fee_for_book("700032", 1)["status"] == "No active loan for this book"
+    assert ls.calculate_late_fee_for_book("700032", 424242)["status"] == "Book not found"
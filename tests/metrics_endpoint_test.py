@@ -0,0 +1,73 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import metrics
+from services import library_service as ls
+
+
+def _sample(text, line_prefix):
+    return next(float(l.rsplit(" ", 1)[1]) for l in text.splitlines() if l.startswith(line_prefix))
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = metrics.Histogram("test_latency_seconds", "Test.", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, op="x")
+
+    lines = hist.render()
+    metrics._METRICS.remove(hist)
+
+    assert 'test_latency_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{op="x",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{op="x",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{op="x"} 3' in lines
+
+
+def test_metrics_endpoint_exposes_requests_db_and_counters(temp_db):
+    from app import create_app
+    client = create_app().test_client()
+    borrows_before = ls.BORROWS.value(outcome="ok")
+
+    client.get("/catalog")
+    client.get("/api/books")
+    client.post("/borrow", data={"patron_id": "123456", "book_id": "1"})
+    resp = client.get("/metrics")
+    text = resp.get_data(as_text=True)
+
+    assert resp.status_code == 200 and resp.mimetype == "text/plain"
+    assert "# TYPE library_request_duration_seconds histogram" in text
+    for blueprint in ("catalog", "api", "borrowing"):
+        assert f'library_request_duration_seconds_count{{blueprint="{blueprint}"' in text
+    assert _sample(text, 'library_borrows_total{outcome="ok"}') == borrows_before + 1
+    assert _sample(text, "library_db_pool_size") == temp_db.POOL_SIZE
+    assert 'library_cache_hits_total{cache="book"}' in text
+    assert text.count("# TYPE library_cache_hits_total") == 1
+
+
+def test_gateway_latency_is_recorded(temp_db, fake_gateway):
+    from services.payment_service import GATEWAY_LATENCY, PaymentGateway
+    before = GATEWAY_LATENCY.count(operation="charge", outcome="ok")
+
+    PaymentGateway(base_url=fake_gateway.base_url).process_payment("123456", 2.0)
+
+    assert GATEWAY_LATENCY.count(operation="charge", outcome="ok") == before + 1
+    assert "library_gateway_request_duration_seconds_bucket" in metrics.render()
+
+
+def test_payment_jobs_gauge_counts_unfinished_jobs(temp_db):
+    from routes.metrics_routes import collect_database
+    for n in range(3):
+        temp_db.enqueue_payment_job("payment", {"patron_id": "123456", "book_id": n})
+    done = temp_db.claim_payment_job()["id"]
+    temp_db.finish_payment_job(done, True, {"success": True})
+    temp_db.claim_payment_job()
+
+    family = next(f for f in collect_database() if f[0] == "library_payment_jobs")
+
+    assert family[3] == [({"status": "queued"}, 1), ({"status": "running"}, 1)]
+
+
+def test_metric_base_class_requires_render():
+    with pytest.raises(TypeError):
+        metrics._Metric("test_abstract", "Test.")
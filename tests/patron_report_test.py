@@ -0,0 +1,27 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+def test_report_lists_loans_fees_and_history(temp_db, add_loan):
+    for days_ago in range(100, 40, -2):
+        add_loan("700040", 1, days_ago - 14, returned=True)
+    add_loan("700040", 1, days_overdue=10)   # 6.50
+    add_loan("700040", 2, days_overdue=-11)  # not yet due
+
+    report = ls.get_patron_status_report("700040", history_limit=5)
+
+    assert report["notes"] == "OK"
+    assert report["borrowed_count"] == 2
+    assert report["total_late_fees"] == 6.50
+    assert {loan["book_id"]: loan["fee_amount"] for loan in report["current_loans"]} == {1: 6.5, 2: 0.0}
+    assert all("due_date" in loan for loan in report["current_loans"])
+    assert report["history_count"] == 32
+    assert len(report["history"]) == 5
+    assert report["history"][0]["book_id"] == 2  # newest first
+
+
+def test_report_for_patron_without_loans(temp_db):
+    report = ls.get_patron_status_report("700041")
+    assert report["borrowed_count"] == 0 and report["history"] == [] and report["history_count"] == 0
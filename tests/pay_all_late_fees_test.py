@@ -0,0 +1,128 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from unittest.mock import Mock
+from services import library_service as ls
+
+
+def test_pay_all_submits_one_itemized_charge(temp_db, gateway_mock, add_loan):
+    add_loan("700060", 1, days_overdue=3)   # 1.50
+    add_loan("700060", 2, days_overdue=10)  # 6.50
+    gateway_mock.process_payment.return_value = (True, "txn_all", "Approved")
+
+    ok, msg, txn = ls.pay_all_late_fees("700060", payment_gateway=gateway_mock)
+
+    assert ok is True and txn == "txn_all" and "2 book(s)" in msg
+    gateway_mock.process_payment.assert_called_once()
+    kwargs = gateway_mock.process_payment.call_args.kwargs
+    assert kwargs["amount"] == 8.00
+    assert "'The Great Gatsby' $1.50" in kwargs["description"]
+    assert "'To Kill a Mockingbird' $6.50" in kwargs["description"]
+    assert temp_db.get_fee_payment_item("txn_all", 2)["amount"] == 6.50
+
+
+def test_pay_all_does_not_charge_twice(temp_db, gateway_mock, add_loan):
+    add_loan("700061", 1, days_overdue=5)
+    gateway_mock.process_payment.return_value = (True, "txn_once", "Approved")
+    ls.pay_all_late_fees("700061", payment_gateway=gateway_mock)
+
+    ok, msg, txn = ls.pay_all_late_fees("700061", payment_gateway=gateway_mock)
+
+    assert ok is False and "No late fees" in msg and txn is None
+    assert gateway_mock.process_payment.call_count == 1
+
+
+def test_pay_all_decline_records_nothing(temp_db, gateway_mock, add_loan):
+    add_loan("700062", 1, days_overdue=5)
+    gateway_mock.process_payment.return_value = (False, "", "declined")
+
+    ok, msg, _ = ls.pay_all_late_fees("700062", payment_gateway=gateway_mock)
+
+    assert ok is False and "Payment failed" in msg
+    assert temp_db.get_fees_paid_by_loan("700062") == {}
+
+
+def test_partial_refund_of_one_book(temp_db, gateway_mock, add_loan):
+    add_loan("700063", 1, days_overdue=3)   # 1.50
+    add_loan("700063", 2, days_overdue=10)  # 6.50
+    gateway_mock.process_payment.return_value = (True, "txn_mix", "Approved")
+    gateway_mock.refund_payment.return_value = (True, "Refunded")
+    ls.pay_all_late_fees("700063", payment_gateway=gateway_mock)
+
+    ok, msg = ls.refund_late_fee_payment("txn_mix", 6.50, payment_gateway=gateway_mock, book_id=2)
+    assert ok is True
+    gateway_mock.refund_payment.assert_called_once_with("txn_mix", 6.50)
+
+    ok, msg = ls.refund_late_fee_payment("txn_mix", 1.00, payment_gateway=gateway_mock, book_id=2)
+    assert ok is False and "exceeds the fee paid" in msg
+    ok, msg = ls.refund_late_fee_payment("txn_mix", 1.00, payment_gateway=gateway_mock, book_id=3)
+    assert ok is False and "No late fee for this book" in msg
+
+
+def test_single_book_payment_then_pay_all_charges_once(temp_db, gateway_mock, add_loan):
+    add_loan("700064", 1, days_overdue=20)  # 15.00 (capped)
+    gateway_mock.process_payment.return_value = (True, "txn_single", "Approved")
+
+    ok, _, _ = ls.pay_late_fees("700064", 1, payment_gateway=gateway_mock)
+    assert ok is True and gateway_mock.process_payment.call_args.kwargs["amount"] == 15.00
+    assert temp_db.get_fee_payment_item("txn_single", 1)["amount"] == 15.00
+
+    ok, msg, txn = ls.pay_all_late_fees("700064", payment_gateway=gateway_mock)
+    assert ok is False and "No late fees to pay" in msg and txn is None
+    assert gateway_mock.process_payment.call_count == 1
+
+
+def test_pay_all_then_single_book_payment_charges_once(temp_db, gateway_mock, add_loan):
+    add_loan("700065", 1, days_overdue=20)
+    gateway_mock.process_payment.return_value = (True, "txn_all_first", "Approved")
+    ls.pay_all_late_fees("700065", payment_gateway=gateway_mock)
+
+    assert ls.calculate_late_fee_for_book("700065", 1)["fee_amount"] == 0.0
+    ok, msg, txn = ls.pay_late_fees("700065", 1, payment_gateway=gateway_mock)
+    assert ok is False and "No late fees to pay" in msg and txn is None
+    assert gateway_mock.process_payment.call_count == 1
+
+
+def test_report_and_return_show_fees_net_of_payments(temp_db, gateway_mock, add_loan):
+    add_loan("700066", 1, days_overdue=3, take_copy=True)   # 1.50
+    add_loan("700066", 2, days_overdue=10, take_copy=True)  # 6.50
+    gateway_mock.process_payment.return_value = (True, "txn_net", "Approved")
+    ls.pay_late_fees("700066", 1, payment_gateway=gateway_mock)
+
+    report = ls.get_patron_status_report("700066")
+    assert report["total_late_fees"] == 6.50
+    assert {loan["book_id"]: loan["fee_amount"] for loan in report["current_loans"]} == {1: 0.0, 2: 6.5}
+
+    ls.pay_all_late_fees("700066", payment_gateway=gateway_mock)
+    assert ls.get_patron_status_report("700066")["total_late_fees"] == 0.0
+    ok, msg = ls.return_book_by_patron("700066", 2)
+    assert ok is True and "No late fee." in msg
+
+
+def test_item_refund_is_reserved_before_the_gateway_call(temp_db, gateway_mock, add_loan):
+    add_loan("700067", 2, days_overdue=10)  # 6.50
+    gateway_mock.process_payment.return_value = (True, "txn_race", "Approved")
+    ls.pay_all_late_fees("700067", payment_gateway=gateway_mock)
+    overlapping = []
+
+    def _refund(txn, amount):
+        # A second refund arriving while the first is still at the gateway
+        overlapping.append(ls.refund_late_fee_payment(txn, 6.50, payment_gateway=Mock(), book_id=2))
+        return True, "Refunded"
+    gateway_mock.refund_payment.side_effect = _refund
+
+    assert ls.refund_late_fee_payment("txn_race", 6.50, payment_gateway=gateway_mock, book_id=2)[0] is True
+    assert overlapping == [(False, "Refund amount exceeds the fee paid for this book.")]
+    assert temp_db.get_fee_payment_item("txn_race", 2)["refunded_amount"] == 6.50
+
+
+def test_declined_item_refund_releases_the_reservation(temp_db, gateway_mock, add_loan):
+    add_loan("700068", 2, days_overdue=10)
+    gateway_mock.process_payment.return_value = (True, "txn_decline", "Approved")
+    gateway_mock.refund_payment.return_value = (False, "declined")
+    ls.pay_all_late_fees("700068", payment_gateway=gateway_mock)
+
+    ok, msg = ls.refund_late_fee_payment("txn_decline", 6.50, payment_gateway=gateway_mock, book_id=2)
+
+    assert ok is False and "Refund failed" in msg
+    assert temp_db.get_fee_payment_item("txn_decline", 2)["refunded_amount"] == 0.0
@@ -74,8 +74,8 @@ def test_pay_late_fees_gateway_exception(monkeypatch, stub_book_found, stub_fee,
 
 
 def test_pay_late_fees_fee_info_missing_key(monkeypatch, stub_book_found, gateway_mock):
-    monkeypatch.setattr(ls, "calculate_late_fee_for_book",
-                        lambda pid, bid: {"days_overdue": 3, "status": "ok"})
+    monkeypatch.setattr(ls, "_late_fee_owed_for_book",
+                        lambda pid, bid: ({"days_overdue": 3, "status": "ok"}, []))
 
     ok, msg, txn = ls.pay_late_fees("700002", 42, payment_gateway=gateway_mock)
 
@@ -136,7 +136,7 @@ def test_pay_late_fees_uses_default_gateway_when_none(monkeypatch, stub_book_fou
 
 
 def test_pay_late_fees_fee_info_none(monkeypatch, stub_book_found, gateway_mock):
-    monkeypatch.setattr(ls, "calculate_late_fee_for_book", lambda pid, bid: None)
+    monkeypatch.setattr(ls, "_late_fee_owed_for_book", lambda pid, bid: (None, []))
     ok, msg, txn = ls.pay_late_fees("700002", 42, payment_gateway=gateway_mock)
     gateway_mock.process_payment.assert_not_called()
     assert ok is False and "Unable to calculate" in msg and txn is None
@@ -152,7 +152,7 @@ def test_pay_late_fees_invalid_book_id_type(monkeypatch, stub_book_found, stub_f
 
 
 def test_pay_late_fees_fee_info_status_not_ok(monkeypatch, stub_book_found, gateway_mock):
-    monkeypatch.setattr(ls,"calculate_late_fee_for_book",lambda pid, bid: {"fee_amount": 0.0, "days_overdue": 3, "status": "DB error"}
+    monkeypatch.setattr(ls,"_late_fee_owed_for_book",lambda pid, bid: ({"fee_amount": 0.0, "days_overdue": 3, "status": "DB error"}, [])
     )
     ok, msg, txn = ls.pay_late_fees("700002", 1, payment_gateway=gateway_mock)
     gateway_mock.process_payment.assert_not_called()
@@ -162,7 +162,7 @@ def test_pay_late_fees_fee_info_status_not_ok(monkeypatch, stub_book_found, gate
 
 
 def test_pay_late_fees_negative_fee_rejected(monkeypatch, stub_book_found, gateway_mock):
-    monkeypatch.setattr(ls,"calculate_late_fee_for_book",lambda pid, bid: {"fee_amount": -1.0, "days_overdue": 0, "status": "ok"}
+    monkeypatch.setattr(ls,"_late_fee_owed_for_book",lambda pid, bid: ({"fee_amount": -1.0, "days_overdue": 0, "status": "ok"}, [])
     )
     ok, msg, txn = ls.pay_late_fees("700002", 2, payment_gateway=gateway_mock)
     gateway_mock.process_payment.assert_not_called()
@@ -172,7 +172,7 @@ def test_pay_late_fees_negative_fee_rejected(monkeypatch, stub_book_found, gatew
 
 
 def test_pay_late_fees_amount_rounds_to_cents(monkeypatch, stub_book_found, gateway_mock):
-    monkeypatch.setattr(ls,"calculate_late_fee_for_book",lambda pid, bid: {"fee_amount": 2.345, "days_overdue": 1, "status": "ok"}
+    monkeypatch.setattr(ls,"_late_fee_owed_for_book",lambda pid, bid: ({"fee_amount": 2.345, "days_overdue": 1, "status": "ok"}, [])
     )
     gateway_mock.process_payment.return_value = (True, "txn_rnd", "Approved")
     ok, msg, txn = ls.pay_late_fees("700002", 3, payment_gateway=gateway_mock)
@@ -205,51 +205,53 @@ def test_add_book_author_required_and_length(monkeypatch):
     ok, msg = ls.add_book_to_catalog("Title", long_author, "9781234567890", 1)
     assert ok is False and "less than 100 characters" in msg
 
+def _borrow_result(status, title="T"):
+    return lambda *a, **k: {"status": status, "title": title, "lock_wait_ms": 0.0}
+
 def test_borrow_unavailable_book(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_id", lambda bid: {"id": bid, "available_copies": 0})
+    monkeypatch.setattr(ls, "borrow_book_atomic", _borrow_result("unavailable"))
     ok, msg = ls.borrow_book_by_patron("700002", 1)
     assert ok is False and "not available" in msg
 
-def test_borrow_insert_record_failure(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_id", lambda bid: {"id": bid, "available_copies": 1, "title": "T"})
-    monkeypatch.setattr(ls, "get_patron_borrow_count", lambda pid: 0)
-    monkeypatch.setattr(ls, "insert_borrow_record", lambda *a, **k: False)
+def test_borrow_transaction_failure(monkeypatch):
+    monkeypatch.setattr(ls, "borrow_book_atomic", _borrow_result("error", None))
     ok, msg = ls.borrow_book_by_patron("700002", 1)
     assert ok is False and "creating borrow record" in msg
 
-def test_borrow_update_availability_failure(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_id", lambda bid: {"id": bid, "available_copies": 1, "title": "T"})
-    monkeypatch.setattr(ls, "get_patron_borrow_count", lambda pid: 0)
-    monkeypatch.setattr(ls, "insert_borrow_record", lambda *a, **k: True)
-    monkeypatch.setattr(ls, "update_book_availability", lambda *a, **k: False)
+def test_borrow_limit_reached(monkeypatch):
+    monkeypatch.setattr(ls, "borrow_book_atomic", _borrow_result("limit"))
     ok, msg = ls.borrow_book_by_patron("700002", 1)
-    assert ok is False and "updating book availability" in msg
+    assert ok is False and "maximum borrowing limit" in msg
+
 
+def _return_result(status, due_date=None):
+    loans = [{"id": 1, "due_date": due_date}] if due_date else []
+    return lambda *a, **k: {"status": status, "title": "T", "due_date": due_date, "loans": loans, "lock_wait_ms": 0.0}
 
 def test_return_no_active_record(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_id", lambda bid: {"id": bid, "title": "T"})
-    monkeypatch.setattr(ls, "update_borrow_record_return_date", lambda *a, **k: False)
+    monkeypatch.setattr(ls, "return_book_atomic", _return_result("no_loan"))
     ok, msg = ls.return_book_by_patron("700002", 1)
     assert ok is False and "No active borrow record" in msg
 
-def test_return_update_availability_failure(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_id", lambda bid: {"id": bid, "title": "T"})
-    monkeypatch.setattr(ls, "update_borrow_record_return_date", lambda *a, **k: True)
-    monkeypatch.setattr(ls, "update_book_availability", lambda *a, **k: False)
+def test_return_transaction_failure(monkeypatch):
+    monkeypatch.setattr(ls, "return_book_atomic", _return_result("error"))
     ok, msg = ls.return_book_by_patron("700002", 1)
-    assert ok is False and "update book availability" in msg
+    assert ok is False and "Database error" in msg
 
+def test_return_computes_fee_from_due_date(monkeypatch, temp_db):
+    due = ls.datetime.now() - ls.timedelta(days=10, hours=1)
+    monkeypatch.setattr(ls, "return_book_atomic", _return_result("ok", due))
+    ok, msg = ls.return_book_by_patron("700002", 1)
+    assert ok is True and "Late fee: $6.50" in msg
 
-def test_search_isbn_miss_fallback_list_scan(monkeypatch):
-    monkeypatch.setattr(ls, "get_book_by_isbn", lambda normalized: None)
-    monkeypatch.setattr(ls, "get_all_books", lambda: [
-        {"id": 1, "isbn": "9780132350884", "title": "Clean Code"},
-        {"id": 2, "isbn": "9780596007126", "title": "Head First Design Patterns"},
-    ])
+
+def test_search_isbn_miss_does_not_scan_catalog(monkeypatch):
+    monkeypatch.setattr(ls, "get_book_by_isbn", lambda isbn: None)
+    monkeypatch.setattr(ls, "get_all_books", lambda: pytest.fail("ISBN search must not scan the catalog"))
     out = ls.search_books_in_catalog("978-0132350884", "isbn")
-    assert len(out) == 1 and out[0]["title"] == "Clean Code"
+    assert out == []
 
-def test_status_report_borrow_count_exception(monkeypatch):
-    monkeypatch.setattr(ls, "get_patron_borrow_count", lambda pid: (_ for _ in ()).throw(RuntimeError("db down")))
+def test_status_report_loan_query_exception(monkeypatch):
+    monkeypatch.setattr(ls, "get_patron_borrowed_books", lambda pid: (_ for _ in ()).throw(RuntimeError("db down")))
     out = ls.get_patron_status_report("700002")
-    assert out["notes"] == "Unable to fetch borrow count"
\ No newline at end of file
+    assert out["notes"] == "Unable to fetch patron loans"
\ No newline at end of file
@@ -0,0 +1,90 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import payment_service
+from services.payment_service import CircuitBreaker, PaymentGateway
+
+
+@pytest.fixture(autouse=True)
+def fresh_gateway_state():
+    payment_service.reset_gateway_state()
+    yield
+    payment_service.reset_gateway_state()
+
+
+def _gateway(fake_gateway, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return PaymentGateway(base_url=fake_gateway.base_url, **kwargs)
+
+
+def test_http_charge_refund_and_status(fake_gateway):
+    gateway = _gateway(fake_gateway)
+
+    ok, txn, msg = gateway.process_payment("123456", 4.5, "Late fees")
+    assert ok is True and txn.startswith("txn_123456")
+    assert gateway.refund_payment(txn, 4.5)[0] is True
+    assert gateway.verify_payment_status(txn)["status"] == "refunded"
+    assert gateway.verify_payment_status("txn_missing")["status"] == "not_found"
+
+
+def test_session_reuses_connections_across_instances(fake_gateway):
+    for _ in range(5):
+        _gateway(fake_gateway).process_payment("123456", 1.0)
+
+    assert len(fake_gateway.charges) == 5
+    assert fake_gateway.connections == 1
+
+
+def test_retries_reuse_idempotency_key(fake_gateway):
+    fake_gateway.fail_next = 2
+    gateway = _gateway(fake_gateway, max_retries=2)
+
+    ok, txn, _ = gateway.process_payment("123456", 3.0)
+
+    assert ok is True
+    keys = {headers["Idempotency-Key"] for _, _, headers, _ in fake_gateway.requests}
+    assert len(fake_gateway.requests) == 3 and len(keys) == 1
+    assert gateway.get_metrics()["operations"]["charge"]["retries"] == 2
+
+
+def test_decline_is_not_retried(fake_gateway):
+    ok, txn, msg = _gateway(fake_gateway).process_payment("123456", 5000.0)
+
+    assert ok is False and "exceeds limit" in msg
+    assert len(fake_gateway.requests) == 1
+
+
+def test_read_timeout_is_reported(fake_gateway):
+    fake_gateway.delay = 0.5
+    gateway = _gateway(fake_gateway, read_timeout=0.1, max_retries=0)
+
+    ok, txn, msg = gateway.process_payment("123456", 1.0)
+
+    assert ok is False and "Timeout" in msg
+
+
+def test_circuit_opens_and_fails_fast(fake_gateway):
+    fake_gateway.fail_next = 10
+    gateway = _gateway(fake_gateway, max_retries=0, failure_threshold=2, reset_timeout=60)
+
+    gateway.process_payment("123456", 1.0)
+    gateway.process_payment("123456", 1.0)
+    ok, _, msg = gateway.process_payment("123456", 1.0)
+
+    assert ok is False and "circuit open" in msg
+    assert len(fake_gateway.requests) == 2
+    metrics = gateway.get_metrics()
+    assert metrics["circuits"][fake_gateway.base_url] == "open"
+    assert metrics["operations"]["charge"]["rejected"] == 1
+    assert metrics["operations"]["charge"]["errors"] == 2
+
+
+def test_half_open_trial_closes_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # only one trial call at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
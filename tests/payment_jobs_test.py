@@ -0,0 +1,158 @@
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import payment_jobs
+
+
+@pytest.fixture
+def jobs_db(temp_db):
+    yield temp_db
+    payment_jobs.stop_payment_workers()
+
+
+def _wait_for(job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = payment_jobs.get_job_status(job_id)
+        if status["status"] in ("succeeded", "failed"):
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {status['status']}")
+
+
+def test_jobs_are_claimed_once_in_order(jobs_db):
+    first = jobs_db.enqueue_payment_job("payment", {"patron_id": "123456", "book_id": 1})
+    second = jobs_db.enqueue_payment_job("refund", {"transaction_id": "txn_1", "amount": 1.0})
+
+    assert jobs_db.claim_payment_job()["id"] == first
+    job = jobs_db.claim_payment_job()
+    assert job["id"] == second and job["payload"]["amount"] == 1.0 and job["attempts"] == 1
+    assert jobs_db.claim_payment_job() is None
+    assert payment_jobs.get_job_status(first)["status"] == "running"
+
+
+def test_submit_validates_before_queuing(jobs_db):
+    assert payment_jobs.submit_payment("12", 1) == (False, "Invalid patron ID. Must be exactly 6 digits.", None)
+    ok, msg, job_id = payment_jobs.submit_refund("bad", 1.0)
+    assert ok is False and job_id is None
+    assert jobs_db.claim_payment_job() is None
+
+
+def test_worker_pool_processes_payment(jobs_db, gateway_mock, add_loan):
+    add_loan("700070", 1, days_overdue=4)
+    gateway_mock.process_payment.return_value = (True, "txn_job", "Approved")
+    payment_jobs.start_payment_workers(2, poll_interval=0.05, gateway_factory=lambda: gateway_mock)
+
+    ok, msg, job_id = payment_jobs.submit_payment("700070", 1)
+    status = _wait_for(job_id)
+
+    assert ok is True
+    assert status["status"] == "succeeded" and status["transaction_id"] == "txn_job"
+    gateway_mock.process_payment.assert_called_once()
+
+
+def test_declined_payment_fails_job(jobs_db, gateway_mock, add_loan):
+    add_loan("700071", 1, days_overdue=4)
+    gateway_mock.process_payment.return_value = (False, "", "declined")
+    payment_jobs.start_payment_workers(1, poll_interval=0.05, gateway_factory=lambda: gateway_mock)
+
+    _, _, job_id = payment_jobs.submit_payment("700071", 1)
+    status = _wait_for(job_id)
+
+    assert status["status"] == "failed" and "declined" in status["message"]
+
+
+def test_stale_running_jobs_are_failed(jobs_db):
+    job_id = jobs_db.enqueue_payment_job("payment", {"patron_id": "123456", "book_id": 1})
+    jobs_db.claim_payment_job()
+
+    assert jobs_db.fail_stale_payment_jobs(datetime.now() + timedelta(seconds=1)) == 1
+    assert payment_jobs.get_job_status(job_id)["status"] == "failed"
+
+
+def test_payment_api_queues_and_reports(jobs_db, fake_gateway, add_loan):
+    from app import create_app
+    add_loan("700072", 2, days_overdue=2)
+    app = create_app()
+    app.config["PAYMENT_GATEWAY_URL"] = fake_gateway.base_url
+    client = app.test_client()
+
+    resp = client.post("/api/payments", json={"patron_id": "700072", "book_id": 2})
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+    _wait_for(job_id)
+
+    body = client.get(f"/api/payments/{job_id}").get_json()
+    assert body["status"] == "succeeded" and body["transaction_id"] in fake_gateway.charges
+    assert client.get("/api/payments/9999").status_code == 404
+    assert client.post("/api/payments", json={"patron_id": "700072"}).status_code == 400
+
+
+def test_duplicate_payment_is_refused_while_in_progress(jobs_db):
+    from app import create_app
+    app = create_app()
+    app.config["PAYMENT_WORKERS"] = 0
+    client = app.test_client()
+
+    first = client.post("/api/payments", json={"patron_id": "700073", "book_id": 1})
+    retry = client.post("/api/payments", json={"patron_id": "700073", "book_id": 1})
+    assert first.status_code == 202 and retry.status_code == 409
+    job_id = first.get_json()["job_id"]
+    assert retry.get_json()["job_id"] == job_id and "already in progress" in retry.get_json()["message"]
+    assert payment_jobs.submit_payment("700073", 2)[0] is True
+
+    job = jobs_db.claim_payment_job()
+    assert job["id"] == job_id
+    assert payment_jobs.submit_payment("700073", 1) == (
+        False, "A payment for this book is already in progress.", job_id
+    )
+    jobs_db.finish_payment_job(job_id, False, {"success": False, "message": "declined"})
+    ok, _, new_id = payment_jobs.submit_payment("700073", 1)
+    assert ok is True and new_id != job_id
+
+
+def test_duplicate_refund_is_refused_while_in_progress(jobs_db):
+    ok, _, job_id = payment_jobs.submit_refund("txn_dup", 2.0, book_id=1)
+    assert ok is True
+    assert payment_jobs.submit_refund("txn_dup", 2.0, book_id=1) == (
+        False, "A refund of this payment is already in progress.", job_id
+    )
+    assert payment_jobs.submit_refund("txn_dup", 2.0)[2] == job_id
+    assert payment_jobs.submit_refund("txn_dup", 1.0, book_id=2)[0] is True
+
+
+def test_pay_all_job_excludes_single_book_jobs_of_the_patron(jobs_db):
+    from app import create_app
+    app = create_app()
+    app.config["PAYMENT_WORKERS"] = 0
+    client = app.test_client()
+
+    single = payment_jobs.submit_payment("700074", 1)[2]
+    resp = client.post("/api/late_fees/700074/pay")
+    assert resp.status_code == 409 and resp.get_json()["job_id"] == single
+    jobs_db.finish_payment_job(single, True, {"success": True, "message": "ok"})
+
+    resp = client.post("/api/late_fees/700074/pay")
+    assert resp.status_code == 202
+    all_id = resp.get_json()["job_id"]
+    assert payment_jobs.submit_payment("700074", 2) == (
+        False, "A payment for this book is already in progress.", all_id
+    )
+    assert payment_jobs.submit_payment("700075", 2)[0] is True
+    assert client.post("/api/late_fees/12/pay").status_code == 400
+
+
+def test_worker_pool_processes_pay_all(jobs_db, gateway_mock, add_loan):
+    add_loan("700076", 1, days_overdue=3)
+    add_loan("700076", 2, days_overdue=10)
+    gateway_mock.process_payment.return_value = (True, "txn_all_job", "Approved")
+    payment_jobs.start_payment_workers(1, poll_interval=0.05, gateway_factory=lambda: gateway_mock)
+
+    ok, _, job_id = payment_jobs.submit_pay_all("700076")
+    status = _wait_for(job_id)
+
+    assert ok is True and status["status"] == "succeeded" and status["transaction_id"] == "txn_all_job"
+    assert gateway_mock.process_payment.call_args.kwargs["amount"] == 8.00
@@ -0,0 +1,72 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cache import LRUCache
+from services import library_service as ls
+
+
+@pytest.fixture
+def status_db(temp_db, monkeypatch):
+    monkeypatch.setattr(ls, "_payment_status_cache", LRUCache(16, ttl=60))
+    return temp_db
+
+
+def test_settled_status_is_fetched_once(status_db, gateway_mock):
+    gateway_mock.verify_payment_status.return_value = {
+        "transaction_id": "txn_a", "status": "completed", "amount": 2.5
+    }
+
+    first = ls.get_payment_status("txn_a", gateway_mock)
+    second = ls.get_payment_status("txn_a", gateway_mock)
+
+    assert first == second and second["status"] == "completed"
+    gateway_mock.verify_payment_status.assert_called_once_with("txn_a")
+    assert status_db.get_payment_transaction("txn_a")["amount"] == 2.5
+    assert ls.get_payment_status_cache_stats()["hits"] == 1
+
+
+def test_pending_status_always_asks_gateway(status_db, gateway_mock):
+    gateway_mock.verify_payment_status.return_value = {"transaction_id": "txn_p", "status": "pending"}
+
+    ls.get_payment_status("txn_p", gateway_mock)
+    ls.get_payment_status("txn_p", gateway_mock)
+
+    assert gateway_mock.verify_payment_status.call_count == 2
+    assert status_db.get_payment_transaction("txn_p") is None
+
+
+def test_payment_and_refund_are_served_from_ledger(status_db, gateway_mock, stub_book_found, stub_fee, monkeypatch):
+    stub_fee(monkeypatch, amt=3.0)
+    gateway_mock.process_payment.return_value = (True, "txn_led", "Approved")
+    gateway_mock.refund_payment.return_value = (True, "Refunded")
+
+    ls.pay_late_fees("123456", 1, gateway_mock)
+    assert ls.get_payment_status("txn_led", gateway_mock) == {
+        "transaction_id": "txn_led", "status": "completed", "amount": 3.0
+    }
+
+    ls.refund_late_fee_payment("txn_led", 3.0, gateway_mock)
+    assert ls.get_payment_status("txn_led", gateway_mock)["status"] == "refunded"
+    gateway_mock.verify_payment_status.assert_not_called()
+
+
+def test_partial_refund_is_not_served_as_final(status_db, gateway_mock, add_loan):
+    add_loan("123457", 1, days_overdue=20)  # 15.00
+    add_loan("123457", 2, days_overdue=17)  # 13.50 -> 28.50 in one charge
+    gateway_mock.process_payment.return_value = (True, "txn_part", "Approved")
+    gateway_mock.refund_payment.return_value = (True, "Refunded")
+    gateway_mock.verify_payment_status.return_value = {
+        "transaction_id": "txn_part", "status": "completed", "amount": 28.5
+    }
+    ls.pay_all_late_fees("123457", gateway_mock)
+
+    assert ls.refund_late_fee_payment("txn_part", 1.0, gateway_mock, book_id=1)[0] is True
+    assert status_db.get_payment_transaction("txn_part")["status"] == "partially_refunded"
+    assert ls.get_payment_status("txn_part", gateway_mock)["status"] == "completed"
+    gateway_mock.verify_payment_status.assert_called_once_with("txn_part")
+
+    assert ls.refund_late_fee_payment("txn_part", 14.0, gateway_mock, book_id=1)[0] is True
+    assert ls.refund_late_fee_payment("txn_part", 13.5, gateway_mock, book_id=2)[0] is True
+    assert ls.get_payment_status("txn_part", gateway_mock)["status"] == "refunded"
+    assert gateway_mock.verify_payment_status.call_count == 1
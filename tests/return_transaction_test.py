@@ -0,0 +1,37 @@
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+def test_return_closes_loan_and_restocks(temp_db):
+    ls.borrow_book_by_patron("700020", 2)
+    ok, msg = ls.return_book_by_patron("700020", 2)
+    assert ok is True and "No late fee" in msg
+    assert temp_db.get_patron_borrow_count("700020") == 0
+    assert temp_db.get_book_by_id(2)["available_copies"] == 2
+
+
+def test_return_overdue_loan_reports_fee(temp_db, add_loan):
+    add_loan("700021", 1, days_overdue=20, take_copy=True)
+    ok, msg = ls.return_book_by_patron("700021", 1)
+    assert ok is True and "Late fee: $15.00" in msg
+
+
+def test_return_without_open_loan_leaves_stock_alone(temp_db):
+    before = temp_db.get_book_by_id(1)["available_copies"]
+    result = temp_db.return_book_atomic("700022", 1, datetime.now())
+    assert result["status"] == "no_loan" and result["due_date"] is None
+    assert temp_db.get_book_by_id(1)["available_copies"] == before
+
+    ok, msg = ls.return_book_by_patron("700022", 1)
+    assert ok is False and msg == "No active borrow record for this patron and book."
+
+
+def test_late_fee_tiers():
+    now = datetime.now()
+    assert ls._late_fee(now + timedelta(days=1), now) == (0, 0.0)
+    assert ls._late_fee(now - timedelta(days=3), now) == (3, 1.5)
+    assert ls._late_fee(now - timedelta(days=9), now) == (9, 5.5)
+    assert ls._late_fee(now - timedelta(days=40), now) == (40, 15.0)
@@ -0,0 +1,65 @@
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import database
+from services import library_service as ls
+
+
+def _calls(monkeypatch):
+    calls = []
+    real = ls._search_catalog
+
+    def counting(*args):
+        calls.append(args)
+        return real(*args)
+
+    monkeypatch.setattr(ls, "_search_catalog", counting)
+    return calls
+
+
+def test_equivalent_terms_share_one_entry(temp_db, monkeypatch):
+    calls = _calls(monkeypatch)
+    before = ls.get_search_cache_stats()
+
+    first = ls.search_books_in_catalog("gatsby", "title")
+    assert [b["title"] for b in first] == ["The Great Gatsby"]
+    assert ls.search_books_in_catalog("  GATSBY ", "Title") == first
+    assert ls.search_books_in_catalog("978-0743273565", "isbn") == ls.search_books_in_catalog("9780743273565", "isbn")
+
+    assert len(calls) == 2
+    stats = ls.get_search_cache_stats()
+    assert stats["hits"] - before["hits"] == 2
+    assert 0 < stats["hit_rate"] <= 1
+
+    first[0]["title"] = "changed by caller"
+    assert ls.search_books_in_catalog("gatsby", "title")[0]["title"] == "The Great Gatsby"
+
+
+def test_insert_and_availability_change_invalidate(temp_db, monkeypatch):
+    calls = _calls(monkeypatch)
+
+    assert ls.search_books_in_catalog("kafka", "author") == []
+    assert temp_db.insert_book("The Trial", "Franz Kafka", "9780805209990", 2, 2)
+    assert [b["title"] for b in ls.search_books_in_catalog("kafka", "author")] == ["The Trial"]
+
+    book = ls.search_books_in_catalog("gatsby", "title")[0]
+    assert temp_db.update_book_availability(book["id"], -1)
+    assert ls.search_books_in_catalog("gatsby", "title")[0]["available_copies"] == book["available_copies"] - 1
+
+    ok, _ = ls.borrow_book_by_patron("123456", book["id"])
+    assert ok
+    assert ls.search_books_in_catalog("gatsby", "title")[0]["available_copies"] == book["available_copies"] - 2
+    assert len(calls) == 5
+
+
+def test_writes_from_another_connection_are_seen(temp_db):
+    book = ls.search_books_in_catalog("gatsby", "title")[0]
+
+    conn = sqlite3.connect(temp_db.DATABASE)
+    conn.execute("UPDATE books SET title = 'The Great Gatsby (Annotated)' WHERE id = ?", (book["id"],))
+    conn.commit()
+    conn.close()
+
+    database.get_catalog_version(force=True)  # what the next periodic check would do
+    assert ls.search_books_in_catalog("gatsby", "title")[0]["title"] == "The Great Gatsby (Annotated)"
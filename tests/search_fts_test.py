@@ -0,0 +1,75 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from services import library_service as ls
+
+
+def test_title_search_matches_word_prefix_case_insensitive(temp_db):
+    rows = ls.search_books_in_catalog("MOCKING", "title")
+    assert [r["title"] for r in rows] == ["To Kill a Mockingbird"]
+
+
+def test_search_results_keep_catalog_shape(temp_db):
+    rows = ls.search_books_in_catalog("orwell", "author")
+    assert len(rows) == 1
+    assert set(rows[0]) == set(temp_db.get_all_books()[0])
+
+
+def test_search_index_follows_inserts_and_title_updates(temp_db):
+    temp_db.insert_book("Brave New World", "Aldous Huxley", "9780060850524", 2, 2)
+    assert [r["author"] for r in ls.search_books_in_catalog("brave new", "title")] == ["Aldous Huxley"]
+
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE books SET title = 'Island' WHERE isbn = '9780060850524'")
+    conn.commit()
+    conn.close()
+    assert temp_db.search_books_fts("brave", "title") == []
+    assert temp_db.search_books_fts("island", "title")[0]["author"] == "Aldous Huxley"
+
+
+def test_search_respects_limit(temp_db):
+    for i in range(5):
+        temp_db.insert_book(f"Dune Part {i}", "Frank Herbert", f"978000000000{i}", 1, 1)
+    assert len(ls.search_books_in_catalog("dune", "title", limit=3)) == 3
+
+
+def test_infix_term_uses_trigram_index(temp_db, monkeypatch):
+    monkeypatch.setattr(ls, "get_all_books", lambda: pytest.fail("indexed search must not scan"))
+    assert [r["title"] for r in ls.search_books_in_catalog("ockingb", "title")] == ["To Kill a Mockingbird"]
+    assert [r["title"] for r in ls.search_books_in_catalog("ill a mock", "title")] == ["To Kill a Mockingbird"]
+    assert [r["author"] for r in ls.search_books_in_catalog("RWEL", "author")] == ["George Orwell"]
+    assert ls.search_books_in_catalog("no such book", "title") == []
+
+
+def test_short_terms_fall_back_to_substring_scan(temp_db):
+    assert temp_db.search_books_fts("84", "title") is None
+    assert [r["title"] for r in ls.search_books_in_catalog("84", "title")] == ["1984"]
+
+
+def test_books_fts_uses_trigram_tokenizer(temp_db):
+    conn = temp_db.get_db_connection()
+    try:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'books_fts'").fetchone()["sql"]
+    finally:
+        conn.close()
+    assert "trigram" in sql
+
+
+def test_sqlite_without_trigram_falls_back_to_scan(temp_db, monkeypatch):
+    # Simulate SQLite < 3.34: the trigram tokenizer is unknown.
+    migrations = list(temp_db.MIGRATIONS)
+    migrations[10] = tuple(s.replace("'trigram'", "'unavailable'") for s in migrations[10])
+    monkeypatch.setattr(temp_db, "MIGRATIONS", migrations)
+
+    conn = temp_db.get_db_connection()
+    try:
+        assert temp_db.get_schema_version(conn) == temp_db.SCHEMA_VERSION
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone() is None
+    finally:
+        conn.close()
+
+    assert temp_db.insert_book("Brave New World", "Aldous Huxley", "9780060850524", 2, 2)
+    assert temp_db.search_books_fts("ockingb", "title") is None
+    assert [r["title"] for r in ls.search_books_in_catalog("ockingb", "title")] == ["To Kill a Mockingbird"]
+    assert [r["author"] for r in ls.search_books_in_catalog("new wor", "title")] == ["Aldous Huxley"]